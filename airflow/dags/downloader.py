@@ -1,13 +1,18 @@
 import os
 import re
-import json
+import html
+import time
+import asyncio
 import mimetypes
-import requests
-from urllib.parse import urljoin, unquote
-from concurrent.futures import ThreadPoolExecutor
-from bs4 import BeautifulSoup
+import aiohttp
+import orjson
+from urllib.parse import urljoin, unquote, urlparse
+from selectolax.parser import HTMLParser
 
 class USBDownloaderMultipleFilters:
+    _SANITIZE_RE = re.compile(r'[<>:"/\\|?*]')
+    _HREF_RE = re.compile(r'<a[^>]*\shref=["\']([^"\']+)["\']', re.IGNORECASE)
+
     def __init__(
         self,
         download_dir="data",
@@ -15,7 +20,8 @@ class USBDownloaderMultipleFilters:
         max_retries=2,
         max_workers=10,
         pagesize=50,
-        category_filters=None
+        category_filters=None,
+        detail_cache_ttl=7 * 24 * 3600
     ):
         self.download_dir = os.path.abspath(download_dir)
         self.track_file = track_file
@@ -23,48 +29,182 @@ class USBDownloaderMultipleFilters:
         self.max_workers = max_workers
         self.pagesize = pagesize
         self.category_filters = category_filters or ["آیین نامه ها", "فرایندها"]
+        self.detail_cache_ttl = detail_cache_ttl
 
         os.makedirs(self.download_dir, exist_ok=True)
 
         if os.path.exists(self.track_file):
-            with open(self.track_file, "r", encoding="utf-8") as f:
-                self.attachments_data = json.load(f)
+            with open(self.track_file, "rb") as f:
+                self.attachments_data = orjson.loads(f.read())
         else:
             self.attachments_data = []
 
+        # Append-only sidecar: every finished download is journaled here and
+        # compacted into track_file at the end of run(), so a crash keeps progress
+        self.journal_path = self.track_file + ".jsonl"
+        self.journal_fsync_every = 20
+        if os.path.exists(self.journal_path):
+            self._replay_journal()
+        self._journal = open(self.journal_path, "a", buffering=1, encoding="utf-8")
+        self._journal_unsynced = 0
+
         self.downloaded_titles = {d["title"] for d in self.attachments_data}
+        # Same file listed under another title, or same bytes behind another URL
+        self.downloaded_urls = {d["url"] for d in self.attachments_data}
+        self.downloaded_fingerprints = {
+            (d["etag"], d["size"]) for d in self.attachments_data if d.get("etag") and d.get("size")
+        }
         self.failed_downloads = []
 
+        # Entry id (or detail URL) -> {"attachments", "fetched_at", "etag", "last_modified"}, so
+        # reruns skip unchanged detail pages; entries older than detail_cache_ttl are revalidated
+        self._detail_cache_path = os.path.join(self.download_dir, ".detail_cache.json")
+        if os.path.exists(self._detail_cache_path):
+            with open(self._detail_cache_path, "rb") as f:
+                self._detail_cache = orjson.loads(f.read())
+        else:
+            self._detail_cache = {}
+
+        # One directory walk up front instead of an exists() syscall per attachment
+        self.existing_paths = self._scan_files(self.download_dir)
+
         self.api_base = "https://www.usb.ac.ir/DesktopModules/DnnSharp/ActionGrid/Api.ashx?method=GetData"
 
-    @staticmethod
-    def sanitize_filename(name):
-        return re.sub(r'[<>:"/\\|?*]', '_', name)
+        # aiohttp session and concurrency bound, created inside the running loop by _run_async
+        self.session = None
+        self.semaphore = None
+        self.page_timeout = aiohttp.ClientTimeout(sock_connect=20, sock_read=20)
+        self.file_timeout = aiohttp.ClientTimeout(sock_connect=30, sock_read=30)
+
+        # Range-resume state: host -> Accept-Ranges support, .part path -> ETag/Last-Modified
+        self.range_support = {}
+        self.part_validators = {}
+
+    def _replay_journal(self):
+        seen = {(d["title"], d["url"]) for d in self.attachments_data}
+        with open(self.journal_path, "rb") as f:
+            for line in f:
+                try:
+                    item = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # blank or torn line left by an interrupted write
+                key = (item["title"], item["url"])
+                if key not in seen:
+                    seen.add(key)
+                    self.attachments_data.append(item)
+
+    def _record_download(self, title, file_url, fingerprint=None):
+        item = {"title": title, "url": file_url}
+        if fingerprint:
+            item["etag"], item["size"] = fingerprint
+            self.downloaded_fingerprints.add(fingerprint)
+        self.attachments_data.append(item)
+        self.downloaded_titles.add(title)
+        self.downloaded_urls.add(file_url)
+
+        self._journal.write(orjson.dumps(item).decode() + "\n")
+        self._journal_unsynced += 1
+        if self._journal_unsynced >= self.journal_fsync_every:
+            os.fsync(self._journal.fileno())
+            self._journal_unsynced = 0
+
+    def _save_track_file(self):
+        with open(self.track_file, "wb") as f:
+            f.write(orjson.dumps(self.attachments_data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
+            f.flush()
+            os.fsync(f.fileno())
+
+        # track_file now holds everything the journal did
+        self._journal.truncate(0)
+        self._journal_unsynced = 0
 
-    def download_file(self, title, file_url):
-        parsed = requests.utils.urlparse(file_url)
+    def _save_detail_cache(self):
+        with open(self._detail_cache_path, "wb") as f:
+            f.write(orjson.dumps(self._detail_cache))
+
+    @classmethod
+    def _scan_files(cls, root):
+        paths = set()
+        with os.scandir(root) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    paths |= cls._scan_files(entry.path)
+                elif entry.is_file():
+                    paths.add(entry.path)
+        return paths
+
+    @classmethod
+    def sanitize_filename(cls, name):
+        return cls._SANITIZE_RE.sub('_', name)
+
+    async def _remote_fingerprint(self, file_url):
+        try:
+            async with self.semaphore, self.session.head(
+                file_url, allow_redirects=True, timeout=self.page_timeout
+            ) as r:
+                r.raise_for_status()
+                etag = r.headers.get("ETag")
+                size = r.headers.get("Content-Length")
+        except Exception as e:
+            print(f"HEAD failed for {file_url}: {e}")
+            return None
+        return (etag, size) if etag and size else None
+
+    async def download_file(self, title, file_url):
+        parsed = urlparse(file_url)
         ext = os.path.splitext(unquote(parsed.path))[1].lower() or ".bin"
 
         ext_folder = os.path.join(self.download_dir, ext.lstrip("."))
         os.makedirs(ext_folder, exist_ok=True)
 
         file_path = os.path.join(ext_folder, self.sanitize_filename(title) + ext)
-        if os.path.exists(file_path):
+        if file_path in self.existing_paths:
             if title not in self.downloaded_titles:
-                self.attachments_data.append({"title": title, "url": file_url})
-                self.downloaded_titles.add(title)
+                self._record_download(title, file_url)
+            return True
+
+        if file_url in self.downloaded_urls:
+            return True
+
+        fingerprint = await self._remote_fingerprint(file_url)
+        if fingerprint and fingerprint in self.downloaded_fingerprints:
+            print(f"Skipping {title}: same ETag and size as an earlier download")
             return True
 
+        part_path = file_path + ".part"
         for attempt in range(1, self.max_retries + 1):
             try:
-                r = requests.get(file_url, timeout=30)
-                r.raise_for_status()
-                if not r.content:
+                headers = {}
+                existing = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+                validator = self.part_validators.get(part_path)
+                if existing and validator and self.range_support.get(parsed.netloc):
+                    headers["Range"] = f"bytes={existing}-"
+                    headers["If-Range"] = validator
+
+                async with self.semaphore, self.session.get(
+                    file_url, headers=headers, timeout=self.file_timeout
+                ) as r:
+                    # 416 on a resumed request means the .part file already holds every byte
+                    if not (headers and r.status == 416):
+                        r.raise_for_status()
+                        if parsed.netloc not in self.range_support:
+                            self.range_support[parsed.netloc] = r.headers.get("Accept-Ranges", "").lower() == "bytes"
+                        validator = r.headers.get("ETag") or r.headers.get("Last-Modified")
+                        if validator:
+                            self.part_validators[part_path] = validator
+
+                        # 206 continues the partial file, anything else restarts it
+                        mode = "ab" if r.status == 206 else "wb"
+                        with open(part_path, mode) as f:
+                            async for chunk in r.content.iter_chunked(1 << 20):
+                                f.write(chunk)
+
+                if not os.path.getsize(part_path):
                     raise ValueError("Empty content")
-                with open(file_path, "wb") as f:
-                    f.write(r.content)
-                self.attachments_data.append({"title": title, "url": file_url})
-                self.downloaded_titles.add(title)
+                os.replace(part_path, file_path)
+                self.existing_paths.add(file_path)
+                self.part_validators.pop(part_path, None)
+                self._record_download(title, file_url, fingerprint)
                 print(f"Downloaded: {file_path}")
                 return True
             except Exception as e:
@@ -75,11 +215,11 @@ class USBDownloaderMultipleFilters:
         return False
 
     def extract_detail_url(self, formatted_value):
-        soup = BeautifulSoup(formatted_value, "html.parser")
-        a = soup.find("a")
-        return urljoin("https://www.usb.ac.ir", a["href"]) if a else None
+        # A single anchor snippet; a full HTML parse is not needed to read its href
+        m = self._HREF_RE.search(formatted_value)
+        return urljoin("https://www.usb.ac.ir", html.unescape(m.group(1))) if m else None
 
-    def fetch_page(self, page, category_filter):
+    async def fetch_page(self, page, category_filter):
         params = {
             "page14072": page,
             "size14072": self.pagesize,
@@ -100,15 +240,62 @@ class USBDownloaderMultipleFilters:
             "sortAsc": "true"
         }
         try:
-            r = requests.get(self.api_base, params=params, timeout=20)
-            r.raise_for_status()
-            data = r.json()
+            async with self.semaphore, self.session.get(
+                self.api_base, params=params, timeout=self.page_timeout
+            ) as r:
+                r.raise_for_status()
+                data = await r.json(content_type=None)
             return data.get("results", []), data.get("totalPages", 0)
         except Exception as e:
             print(f"Failed to fetch page {page} for {category_filter}: {e}")
             return [], 0
 
-    def process_entry(self, entry, category_filter):
+    async def _detail_attachments(self, key, detail_url):
+        """
+        Attachment URLs of one detail page, from the detail cache while fresh. Stale entries are
+        revalidated with If-None-Match/If-Modified-Since; an empty list is never cached, since
+        attachments are often posted after the announcement. Returns None if the fetch fails.
+        """
+        cached = self._detail_cache.get(key)
+        if not isinstance(cached, dict):  # missing, or a bare list from an older cache file
+            cached = None
+        elif time.time() - cached.get("fetched_at", 0) < self.detail_cache_ttl:
+            return cached["attachments"]
+
+        headers = {}
+        if cached and cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            async with self.semaphore, self.session.get(
+                detail_url, headers=headers, timeout=self.page_timeout
+            ) as r:
+                if r.status == 304 and cached:
+                    cached["fetched_at"] = time.time()
+                    return cached["attachments"]
+                r.raise_for_status()
+                detail_page = await r.text()
+                etag, last_modified = r.headers.get("ETag"), r.headers.get("Last-Modified")
+            tree = HTMLParser(detail_page)
+            attachments = [urljoin("https://www.usb.ac.ir", a.attributes["href"])
+                           for a in tree.css("a.Normal") if a.attributes.get("href")]
+        except Exception as e:
+            print(f"Failed to fetch detail page {detail_url}: {e}")
+            return None
+
+        if attachments:
+            self._detail_cache[key] = {
+                "attachments": attachments,
+                "fetched_at": time.time(),
+                "etag": etag,
+                "last_modified": last_modified,
+            }
+        else:
+            self._detail_cache.pop(key, None)
+        return attachments
+
+    async def process_entry(self, entry, category_filter):
         fields = {f["Title"]: f["Value"] for f in entry.get("fields", [])}
         title = fields.get("عنوان")
         category = fields.get("نوع سند")
@@ -123,52 +310,54 @@ class USBDownloaderMultipleFilters:
         if not detail_url:
             return
 
-        try:
-            r = requests.get(detail_url, timeout=20)
-            r.raise_for_status()
-            soup = BeautifulSoup(r.text, "html.parser")
-            attachments = [urljoin("https://www.usb.ac.ir", a["href"])
-                           for a in soup.select("a.Normal")]
-            if attachments:
-                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                    for url in attachments:
-                        executor.submit(self.download_file, title, url)
-        except Exception as e:
-            print(f"Failed to fetch detail page {detail_url}: {e}")
+        key = str(entry.get("id") or detail_url)
+        attachments = await self._detail_attachments(key, detail_url)
+        if attachments is None:
+            return
+
+        await asyncio.gather(*(self.download_file(title, url) for url in attachments))
+
+    async def run_category(self, category_filter):
+        results, total_pages = await self.fetch_page(1, category_filter)
+        print(f"Total pages to fetch for '{category_filter}': {total_pages}")
+        if not results:
+            return
+
+        # Page 1 tells us totalPages; the remaining listing pages are fetched together
+        pages = [results]
+        if total_pages > 1:
+            rest = await asyncio.gather(
+                *(self.fetch_page(page, category_filter) for page in range(2, total_pages + 1))
+            )
+            pages.extend(page_results for page_results, _ in rest)
+
+        entries = [entry for page_results in pages for entry in page_results]
+        print(f"Processing {len(entries)} entries from {total_pages} pages for '{category_filter}'")
+        await asyncio.gather(*(self.process_entry(entry, category_filter) for entry in entries))
+
+    async def _run_async(self):
+        self.semaphore = asyncio.Semaphore(self.max_workers)
+        connector = aiohttp.TCPConnector(limit=self.max_workers)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            self.session = session
 
-    def run_category(self, category_filter):
-        page = 1
-        total_pages = None
-        while True:
-            results, total_pages_api = self.fetch_page(page, category_filter)
-            if total_pages is None:
-                total_pages = total_pages_api
-                print(f"Total pages to fetch for '{category_filter}': {total_pages}")
+            # Categories have disjoint listings, so crawl them side by side
+            await asyncio.gather(*(self.run_category(category) for category in self.category_filters))
 
-            if not results or page > total_pages:
-                break
+            # Retry failed downloads
+            if self.failed_downloads:
+                print("Retrying failed downloads...")
+                retry, self.failed_downloads = self.failed_downloads, []
+                await asyncio.gather(*(self.download_file(item["title"], item["url"]) for item in retry))
 
-            print(f"Processing page {page}/{total_pages} for '{category_filter}'")
-            for entry in results:
-                self.process_entry(entry, category_filter)
+            # Save metadata (compacts the journal into track_file)
+            self._save_track_file()
+            self._save_detail_cache()
 
-            page += 1
+        self.session = None
 
     def run(self):
-        for category in self.category_filters:
-            self.run_category(category)
-
-        # Save metadata
-        with open(self.track_file, "w", encoding="utf-8") as f:
-            json.dump(self.attachments_data, f, ensure_ascii=False, indent=2)
-
-        # Retry failed downloads
-        if self.failed_downloads:
-            print("Retrying failed downloads...")
-            for item in self.failed_downloads:
-                self.download_file(item["title"], item["url"])
-            with open(self.track_file, "w", encoding="utf-8") as f:
-                json.dump(self.attachments_data, f, ensure_ascii=False, indent=2)
+        asyncio.run(self._run_async())
 
 
 if __name__ == "__main__":
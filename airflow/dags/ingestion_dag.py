@@ -5,10 +5,10 @@ PEP8 cleaned and fixed function-task mappings.
 
 from __future__ import annotations
 
-import json
 from datetime import datetime, timedelta
 from pathlib import Path
 
+import orjson
 from airflow import DAG
 from airflow.operators.python import PythonOperator
 
@@ -40,7 +40,7 @@ def run_transform() -> None:
     processor = PersianRAGTransformer(
         txt_folder="./data/txt",
         links_json="./data/downloaded_files.json",
-        output_json="./data/rag_dataset_llm.json",
+        output_json="./data/rag_dataset_llm.jsonl",
         chunk_size=400,
     )
     processor.process_documents()
@@ -48,7 +48,7 @@ def run_transform() -> None:
 
 def run_sanity_check() -> None:
     """Analyze failed chunks and save failure report."""
-    analyzer = RagFailureAnalyzer(Path("./data/rag_dataset_llm.json"))
+    analyzer = RagFailureAnalyzer(Path("./data/rag_dataset_llm.jsonl"))
     failed = analyzer.analyze()
 
     print(failed)
@@ -70,8 +70,8 @@ def run_retransform() -> None:
         return
 
     try:
-        with retry_file.open("r", encoding="utf-8") as f:
-            failed_docs = json.load(f)
+        with retry_file.open("rb") as f:
+            failed_docs = orjson.loads(f.read())
 
         if not isinstance(failed_docs, list):
             raise ValueError("Retry file must contain a JSON list.")
@@ -89,11 +89,12 @@ def run_retransform() -> None:
     processor = PersianRAGTransformer(
         txt_folder="./data/txt",
         links_json="./data/downloaded_files.json",
-        output_json="./data/rag_dataset_llm.json",
+        output_json="./data/rag_dataset_llm.jsonl",
         chunk_size=400,
     )
 
-    processor.process_specific_documents(failed_docs)
+    # failure report rows are {"doc_id": ..., "reasons": [...]}; the transformer matches on doc_id
+    processor.process_specific_documents([d["doc_id"] for d in failed_docs])
 
     print(">>> Re-run transform stage completed.")
 
@@ -105,10 +106,10 @@ def run_load() -> None:
         es_index_name="rag_data",
     )
 
-    data_path = Path("./data/rag_dataset_llm.json")
-    data = json.loads(data_path.read_text(encoding="utf-8"))
-
-    storage.store(data)
+    # Stream chunks from disk (one JSON object per line) instead of materializing the dataset
+    data_path = Path("./data/rag_dataset_llm.jsonl")
+    with data_path.open("rb") as fh:
+        storage.store(orjson.loads(line) for line in fh if line.strip())
 
 
 # -------------------------------
@@ -1,10 +1,85 @@
 from pathlib import Path
-from typing import Dict, Set, List
-import json
+from typing import Dict, Set, List, Optional, Tuple
+import functools
+import multiprocessing
+import os
+import orjson
 
 
-REQUIRED_TOPLEVEL_KEYS = {"doc_id", "chunk_id", "chunk_text", "metadata"}
-REQUIRED_METADATA_KEYS = {"title", "page_range", "summary", "topics"}
+REQUIRED_TOPLEVEL_KEYS = frozenset({"doc_id", "chunk_id", "chunk_text", "metadata"})
+REQUIRED_METADATA_KEYS = frozenset({"title", "page_range", "summary", "topics"})
+
+# Below this many chunks, process start-up costs more than the scan itself
+PARALLEL_THRESHOLD = 50_000
+PARALLEL_CHUNKSIZE = 4096
+# Worker processes for large scans; capped so an Airflow task does not fork one per host CPU
+SANITY_CHECK_PROCESSES = int(os.environ.get("SANITY_CHECK_PROCESSES", "4"))
+
+
+def _default_processes() -> int:
+    """SANITY_CHECK_PROCESSES, but no more than the CPUs this task may actually run on."""
+    try:
+        available = len(os.sched_getaffinity(0))  # respects cpusets/affinity of the worker
+    except AttributeError:  # not available on every platform
+        available = os.cpu_count() or 1
+    return max(1, min(SANITY_CHECK_PROCESSES, available))
+
+
+@functools.lru_cache(maxsize=None)
+def _txt_index(folder: str) -> Dict[str, str]:
+    """
+    Map stem -> resolved path for every .txt file in folder.
+    Cached per folder, so repeated failure analyses skip the directory walk;
+    call _txt_index.cache_clear() if the folder changes.
+    """
+    with os.scandir(folder) as it:
+        return {
+            entry.name[:-4]: os.path.realpath(entry.path)
+            for entry in it
+            if entry.name.endswith(".txt") and entry.is_file()
+        }
+
+
+def _check_chunk(idx_chunk: Tuple[int, dict]) -> Optional[Tuple[str, Tuple[str, ...]]]:
+    """
+    Check one (index, chunk) pair.
+    Returns (doc_id, reasons) when the chunk has issues, otherwise None.
+    Module-level so it can be sent to worker processes.
+    """
+    i, chunk = idx_chunk
+    reasons = []
+
+    # 1) Error field
+    if chunk.get("error"):
+        reasons.append("error")
+
+    # 2) Missing top-level keys (dict_keys supports set difference directly)
+    if REQUIRED_TOPLEVEL_KEYS - chunk.keys():
+        reasons.append("missing_toplevel")
+
+    # 3) Empty chunk_text
+    chunk_text = chunk.get("chunk_text", "")
+    if not isinstance(chunk_text, str) or not chunk_text.strip():
+        reasons.append("empty_chunk_text")
+
+    # 4) Metadata
+    metadata = chunk.get("metadata")
+    if not isinstance(metadata, dict):
+        reasons.append("missing_metadata")
+    else:
+        # missing metadata keys
+        if REQUIRED_METADATA_KEYS - metadata.keys():
+            reasons.append("missing_metadata")
+
+        # invalid topics
+        topics = metadata.get("topics")
+        if topics is not None and not isinstance(topics, list):
+            reasons.append("invalid_topics")
+
+    if not reasons:
+        return None
+    doc_id = str(chunk.get("doc_id") or f"__missing_docid_chunk_{i}")
+    return doc_id, tuple(reasons)
 
 
 class RagFailureAnalyzer:
@@ -12,18 +87,19 @@ class RagFailureAnalyzer:
     Analyze RAG JSON entries and extract failed doc_ids with reasons.
     """
 
-    def __init__(self, json_path: Path):
+    def __init__(self, json_path: Path, processes: Optional[int] = None):
         self.json_path = json_path
+        self.processes = processes or _default_processes()
         self.data = self._load_json()
 
     # --------------------------------------------------------------
     def _load_json(self) -> List[dict]:
-        """Load input RAG JSON file."""
+        """Load the RAG dataset (JSON Lines, one chunk per line)."""
         if not self.json_path.exists():
             raise FileNotFoundError(f"Input file not found: {self.json_path}")
 
-        with self.json_path.open("r", encoding="utf-8") as fh:
-            return json.load(fh)
+        with self.json_path.open("rb") as fh:
+            return [orjson.loads(line) for line in fh if line.strip()]
 
     # --------------------------------------------------------------
     def analyze(self) -> Dict[str, Set[str]]:
@@ -32,44 +108,21 @@ class RagFailureAnalyzer:
         """
         failures: Dict[str, Set[str]] = {}
 
-        for i, chunk in enumerate(self.data):
-            doc_id = str(chunk.get("doc_id") or f"__missing_docid_chunk_{i}")
-
-            if doc_id not in failures:
-                failures[doc_id] = set()
-
-            # 1) Error field
-            if chunk.get("error"):
-                failures[doc_id].add("error")
-
-            # 2) Missing top-level keys
-            missing_top = REQUIRED_TOPLEVEL_KEYS - set(chunk.keys())
-            if missing_top:
-                failures[doc_id].add("missing_toplevel")
-
-            # 3) Empty chunk_text
-            chunk_text = chunk.get("chunk_text", "")
-            if not isinstance(chunk_text, str) or not chunk_text.strip():
-                failures[doc_id].add("empty_chunk_text")
-
-            # 4) Metadata
-            metadata = chunk.get("metadata")
-            if not isinstance(metadata, dict):
-                failures[doc_id].add("missing_metadata")
-            else:
-                # missing metadata keys
-                missing_meta = REQUIRED_METADATA_KEYS - set(metadata.keys())
-                if missing_meta:
-                    failures[doc_id].add("missing_metadata")
-
-                # invalid topics
-                topics = metadata.get("topics")
-                if topics is not None and not isinstance(topics, list):
-                    failures[doc_id].add("invalid_topics")
-
-        # remove doc_ids with no issues
-        cleaned = {did: reasons for did, reasons in failures.items() if reasons}
-        return cleaned
+        if len(self.data) > PARALLEL_THRESHOLD:
+            with multiprocessing.Pool(processes=self.processes) as pool:
+                results = list(pool.imap_unordered(
+                    _check_chunk, enumerate(self.data), chunksize=PARALLEL_CHUNKSIZE
+                ))
+        else:
+            results = map(_check_chunk, enumerate(self.data))
+
+        # only doc_ids with issues are recorded
+        for result in results:
+            if result is not None:
+                doc_id, reasons = result
+                failures.setdefault(doc_id, set()).update(reasons)
+
+        return failures
 
     # --------------------------------------------------------------
     @staticmethod
@@ -81,8 +134,8 @@ class RagFailureAnalyzer:
                     for doc_id, reasons in sorted(failed_map.items())]
 
         output_path.parent.mkdir(parents=True, exist_ok=True)
-        with output_path.open("w", encoding="utf-8") as fh:
-            json.dump(out_list, fh, ensure_ascii=False, indent=2)
+        with output_path.open("wb") as fh:
+            fh.write(orjson.dumps(out_list, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS))
 
     # --------------------------------------------------------------
     @staticmethod
@@ -90,13 +143,10 @@ class RagFailureAnalyzer:
         """
         Match doc_ids to txt files and return retry paths.
         """
-        txt_files = {p.stem: p for p in txt_folder.glob("*.txt")}
+        txt_files = _txt_index(str(txt_folder))
         retry_paths = []
 
         for doc_id in sorted(failed_map.keys()):
-            if doc_id in txt_files:
-                retry_paths.append(str(txt_files[doc_id].resolve()))
-            else:
-                retry_paths.append(doc_id)
+            retry_paths.append(txt_files.get(doc_id, doc_id))
 
         return retry_paths
@@ -1,10 +1,14 @@
-from typing import List, Dict, Optional, Any
-import requests
+from typing import AsyncIterator, List, Dict, Optional, Any
+import asyncio
+import json
+import httpx
 import time
 import logging
 
 OPENAI_API_BASE = "https://api.openai.com/v1"
 OPENROUTER_API_BASE = "https://openrouter.ai/api/v1"
+# Connection pool sized for many concurrent chat requests multiplexed over HTTP/2
+HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
 logger = logging.getLogger(__name__)
 
 
@@ -15,12 +19,71 @@ class LLM:
     'max_completion_tokens', and optional temperature handling.
     """
 
-    def __init__(self, model: str, api_key: str, base_url: Optional[str] = None):
+    def __init__(self, model: str, api_key: str, base_url: Optional[str] = None, timeout: int = 60):
         self.api_key = api_key
         self.model = model
         # Auto-detect base URL if not provided
         self.base_url = (base_url or OPENAI_API_BASE).rstrip("/")
         self.is_openrouter = "openrouter.ai" in self.base_url
+        # Fields shared by every request; merged with per-call values in _build_payload
+        self._base_payload = {"model": model}
+        self._headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+        self._timeout = timeout
+        # Persistent HTTP/2 client: keeps the TLS connection alive across calls
+        self._client = httpx.Client(http2=True, timeout=timeout, headers=self._headers, limits=HTTP_LIMITS)
+        # Async counterpart, created on first use inside the caller's event loop
+        self._aclient: Optional[httpx.AsyncClient] = None
+
+    def close(self) -> None:
+        """Close the underlying HTTP connection pool."""
+        self._client.close()
+
+    async def aclose(self) -> None:
+        """Close the async HTTP connection pool, if one was opened."""
+        if self._aclient is not None:
+            await self._aclient.aclose()
+            self._aclient = None
+
+    def _ensure_aclient(self) -> httpx.AsyncClient:
+        """Create the async client on first use, inside the caller's event loop."""
+        if self._aclient is None:
+            self._aclient = httpx.AsyncClient(
+                http2=True, timeout=self._timeout, headers=self._headers, limits=HTTP_LIMITS
+            )
+        return self._aclient
+
+    async def awarmup(self) -> None:
+        """
+        Open the async client's TLS/HTTP2 connection ahead of the first chat request.
+        Uses GET /models, which costs no tokens.
+        """
+        try:
+            resp = await self._ensure_aclient().get(f"{self.base_url}/models")
+            logger.info("LLM API warmup: HTTP %d", resp.status_code)
+        except httpx.HTTPError as e:
+            logger.warning("LLM API warmup failed: %s", e)
+
+    def _build_messages(
+        self,
+        prompt: Optional[str],
+        system: Optional[str],
+        messages: Optional[List[Dict[str, Any]]],
+    ) -> List[Dict[str, Any]]:
+        if not self.api_key:
+            raise RuntimeError("API key is not set for LLM client.")
+        if messages:
+            return messages
+        if system is None or prompt is None:
+            raise ValueError(
+                "If `messages` is not provided, both `system` and `prompt` must be supplied."
+            )
+        return [
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt},
+        ]
 
     def _build_payload(
         self,
@@ -33,19 +96,10 @@ class LLM:
         Build request payload.
         OpenRouter may not support 'temperature' in all models.
         """
-        payload = {
-            "model": self.model,
-            "messages": messages,
-        }
-
+        tokens_key = "max_completion_tokens" if use_completion_tokens else "max_tokens"
+        payload = {**self._base_payload, "messages": messages, tokens_key: max_tokens}
         if temperature is not None:
             payload["temperature"] = temperature
-
-        if use_completion_tokens:
-            payload["max_completion_tokens"] = max_tokens
-        else:
-            payload["max_tokens"] = max_tokens
-
         return payload
 
     def _extract_content(self, data: Dict[str, Any]) -> str:
@@ -81,49 +135,33 @@ class LLM:
         - Retries on transient errors with exponential backoff.
         - Falls back to 'max_completion_tokens' if needed.
         """
-        if not self.api_key:
-            raise RuntimeError("API key is not set for LLM client.")
-
-        if messages:
-            payload_messages = messages
-        else:
-            if system is None or prompt is None:
-                raise ValueError(
-                    "If `messages` is not provided, both `system` and `prompt` must be supplied."
-                )
-            payload_messages = [
-                {"role": "system", "content": system},
-                {"role": "user", "content": prompt},
-            ]
+        payload_messages = self._build_messages(prompt, system, messages)
 
         url = f"{self.base_url}/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-        }
 
         attempt = 0
         current_backoff = backoff
         tried_alternate_param = False
 
+        # Built once; retries resend the same dict and only the 400 fallback edits it
+        payload = self._build_payload(
+            messages=payload_messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+
         while attempt < retries:
             attempt += 1
-            payload = self._build_payload(
-                messages=payload_messages,
-                temperature=temperature if temperature is not None else None,
-                max_tokens=max_tokens,
-                use_completion_tokens=tried_alternate_param,
-            )
 
             try:
-                resp = requests.post(url, headers=headers, json=payload, timeout=timeout)
+                resp = self._client.post(url, json=payload, timeout=timeout)
                 resp.raise_for_status()
                 data = resp.json()
                 return self._extract_content(data)
 
-            except requests.exceptions.HTTPError as e:
-                status = e.response.status_code if e.response else None
-                resp_text = e.response.text if e.response else str(e)
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                resp_text = e.response.text
 
                 if status == 401:
                     logger.error("Unauthorized (401). Check your API key and base_url.")
@@ -133,6 +171,7 @@ class LLM:
                     if not tried_alternate_param:
                         logger.warning("Model rejected 'max_tokens'. Retrying with 'max_completion_tokens'.")
                         tried_alternate_param = True
+                        payload["max_completion_tokens"] = payload.pop("max_tokens")
                         continue
                     raise RuntimeError(f"OpenAI/OpenRouter HTTP 400: {resp_text}") from e
 
@@ -149,7 +188,7 @@ class LLM:
 
                 raise RuntimeError(f"HTTP error: {status} - {resp_text}") from e
 
-            except requests.exceptions.RequestException as e:
+            except httpx.RequestError as e:
                 if attempt < retries:
                     logger.warning("Network error: %s. Retrying %d/%d after %.1fs...", e, attempt, retries, current_backoff)
                     time.sleep(current_backoff)
@@ -161,3 +200,169 @@ class LLM:
                 raise RuntimeError(f"Unexpected error when contacting LLM: {e}") from e
 
         raise RuntimeError("Failed to obtain response after multiple retries.")
+
+    async def astream_response(
+        self,
+        prompt: Optional[str] = None,
+        system: Optional[str] = None,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        temperature: Optional[float] = 0.0,
+        max_tokens: int = 1024,
+        retries: int = 3,
+        backoff: float = 2.0,
+        timeout: int = 60,
+    ) -> AsyncIterator[str]:
+        """
+        Stream the reply as text deltas (chat/completions with stream=true).
+        Retries and the 'max_completion_tokens' fallback apply only before the first delta:
+        once text has been yielded, a failure is raised instead of replaying the reply.
+        """
+        payload_messages = self._build_messages(prompt, system, messages)
+        self._ensure_aclient()
+
+        url = f"{self.base_url}/chat/completions"
+        payload = self._build_payload(
+            messages=payload_messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+        payload["stream"] = True
+
+        attempt = 0
+        current_backoff = backoff
+        tried_alternate_param = False
+        started = False  # a delta reached the caller: retrying would duplicate it
+
+        while attempt < retries:
+            attempt += 1
+            try:
+                async with self._aclient.stream("POST", url, json=payload, timeout=timeout) as resp:
+                    if resp.status_code >= 400:
+                        await resp.aread()
+                        resp.raise_for_status()
+                    async for line in resp.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            return
+                        choices = json.loads(data).get("choices") or [{}]
+                        delta = (choices[0].get("delta") or {}).get("content")
+                        if delta:
+                            started = True
+                            yield delta
+                return
+
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                resp_text = e.response.text
+
+                if status == 400 and ("max_tokens" in resp_text or "unsupported_parameter" in resp_text) \
+                        and not tried_alternate_param:
+                    logger.warning("Model rejected 'max_tokens'. Retrying with 'max_completion_tokens'.")
+                    tried_alternate_param = True
+                    payload["max_completion_tokens"] = payload.pop("max_tokens")
+                    continue
+
+                if status in (429, 502, 503, 504) and attempt < retries:
+                    logger.warning(
+                        "HTTP %s. Retrying %d/%d after %.1fs...",
+                        status, attempt, retries, current_backoff
+                    )
+                    await asyncio.sleep(current_backoff)
+                    current_backoff *= 2
+                    continue
+
+                raise RuntimeError(f"HTTP error: {status} - {resp_text}") from e
+
+            except httpx.RequestError as e:
+                if started:
+                    raise RuntimeError(f"LLM stream interrupted after partial reply: {e}") from e
+                if attempt < retries:
+                    logger.warning("Network error: %s. Retrying %d/%d after %.1fs...", e, attempt, retries, current_backoff)
+                    await asyncio.sleep(current_backoff)
+                    current_backoff *= 2
+                    continue
+                raise RuntimeError(f"Network error when calling LLM: {e}") from e
+
+        raise RuntimeError("Failed to obtain response after multiple retries.")
+
+    async def agenerate_response(
+        self,
+        prompt: Optional[str] = None,
+        system: Optional[str] = None,
+        messages: Optional[List[Dict[str, Any]]] = None,
+        temperature: Optional[float] = 0.0,
+        max_tokens: int = 1024,
+        retries: int = 3,
+        backoff: float = 2.0,
+        timeout: int = 60,
+    ) -> str:
+        """
+        Async variant of generate_response (same retry and fallback rules).
+        Waiting on the API holds no thread, so many requests can be in flight at once.
+        """
+        payload_messages = self._build_messages(prompt, system, messages)
+        self._ensure_aclient()
+
+        url = f"{self.base_url}/chat/completions"
+
+        attempt = 0
+        current_backoff = backoff
+        tried_alternate_param = False
+
+        payload = self._build_payload(
+            messages=payload_messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+        )
+
+        while attempt < retries:
+            attempt += 1
+
+            try:
+                resp = await self._aclient.post(url, json=payload, timeout=timeout)
+                resp.raise_for_status()
+                return self._extract_content(resp.json())
+
+            except httpx.HTTPStatusError as e:
+                status = e.response.status_code
+                resp_text = e.response.text
+
+                if status == 401:
+                    logger.error("Unauthorized (401). Check your API key and base_url.")
+                    raise RuntimeError(f"Unauthorized (401): {resp_text}") from e
+
+                if status == 400 and ("max_tokens" in resp_text or "unsupported_parameter" in resp_text):
+                    if not tried_alternate_param:
+                        logger.warning("Model rejected 'max_tokens'. Retrying with 'max_completion_tokens'.")
+                        tried_alternate_param = True
+                        payload["max_completion_tokens"] = payload.pop("max_tokens")
+                        continue
+                    raise RuntimeError(f"OpenAI/OpenRouter HTTP 400: {resp_text}") from e
+
+                if status in (429, 502, 503, 504):
+                    if attempt < retries:
+                        logger.warning(
+                            "HTTP %s. Retrying %d/%d after %.1fs...",
+                            status, attempt, retries, current_backoff
+                        )
+                        await asyncio.sleep(current_backoff)
+                        current_backoff *= 2
+                        continue
+                    raise RuntimeError(f"HTTP error after retries: {status} - {resp_text}") from e
+
+                raise RuntimeError(f"HTTP error: {status} - {resp_text}") from e
+
+            except httpx.RequestError as e:
+                if attempt < retries:
+                    logger.warning("Network error: %s. Retrying %d/%d after %.1fs...", e, attempt, retries, current_backoff)
+                    await asyncio.sleep(current_backoff)
+                    current_backoff *= 2
+                    continue
+                raise RuntimeError(f"Network error when calling LLM: {e}") from e
+
+            except Exception as e:
+                raise RuntimeError(f"Unexpected error when contacting LLM: {e}") from e
+
+        raise RuntimeError("Failed to obtain response after multiple retries.")
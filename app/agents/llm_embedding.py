@@ -0,0 +1,166 @@
+"""
+agents/llm_embedding.py
+
+Pluggable embedding backends for MemoryAgent.
+The backend is picked from the model name prefix:
+  - "deepsparse:<model>" -> INT8 ONNX model on CPU via DeepSparse
+  - "optimum:<model>"    -> ONNX Runtime model via Hugging Face Optimum
+  - anything else        -> Ollama embeddings (default, e.g. "nomic-embed-text")
+
+Note: switching backend changes the vector space (and often the dimension),
+so use a fresh Chroma persist_dir when moving an existing deployment.
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Sequence
+
+import ollama
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackend:
+    """Interface: turn texts into embedding vectors."""
+
+    def embed(self, text: str) -> List[float]:
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+
+class OllamaBackend(EmbeddingBackend):
+    """Embeddings served by the Ollama daemon (previous MemoryAgent behavior)."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._client = ollama.Client()
+
+    def embed(self, text: str) -> List[float]:
+        response = self._client.embeddings(model=self.model_name, prompt=text)
+        return list(response["embedding"])
+
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        # /api/embed returns unit-norm vectors while embed()'s /api/embeddings does not;
+        # MemoryAgent normalizes every vector, so both land in the same space
+        response = self._client.embed(model=self.model_name, input=list(texts))
+        return [list(e) for e in response["embeddings"]]
+
+
+class DeepSparseBackend(EmbeddingBackend):
+    """
+    INT8-quantized sentence-transformer on CPU, e.g. "neuralmagic/bge-small-en-v1.5-quant".
+    For Persian text use a multilingual quantized model.
+    """
+
+    def __init__(self, model_name: str):
+        try:
+            from deepsparse.sentence_transformers import DeepSparseSentenceTransformer
+        except ImportError as e:
+            raise ImportError("DeepSparse backend requires `pip install deepsparse[sentence_transformers]`") from e
+        self.model_name = model_name
+        self._model = DeepSparseSentenceTransformer(model_name, export=False)
+
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        return [list(map(float, v)) for v in self._model.encode(list(texts))]
+
+
+class OptimumBackend(EmbeddingBackend):
+    """ONNX Runtime feature-extraction model (CLS pooling, L2-normalized, as used by bge models)."""
+
+    def __init__(self, model_name: str):
+        try:
+            from optimum.onnxruntime import ORTModelForFeatureExtraction
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError("Optimum backend requires `pip install optimum[onnxruntime]`") from e
+        self.model_name = model_name
+        self._tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self._model = ORTModelForFeatureExtraction.from_pretrained(model_name)
+
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        inputs = self._tokenizer(list(texts), padding=True, truncation=True, return_tensors="np")
+        cls = self._model(**inputs).last_hidden_state[:, 0]
+        cls = cls / ((cls ** 2).sum(axis=1, keepdims=True) ** 0.5)
+        return cls.tolist()
+
+
+class EmbeddingBatcher(EmbeddingBackend):
+    """
+    Micro-batcher around another backend.
+    embed() calls arriving from concurrent request threads within max_wait_ms
+    are coalesced into one embed_batch() call of up to max_batch texts.
+    embed() gives up after timeout seconds instead of waiting on the worker forever.
+    """
+
+    def __init__(self, backend: EmbeddingBackend, max_wait_ms: float = 10, max_batch: int = 32,
+                 timeout: float = 60):
+        self.backend = backend
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue: "queue.Queue[tuple[str, Future]]" = queue.Queue()
+        threading.Thread(target=self._worker, name="embedding-batcher", daemon=True).start()
+
+    def submit(self, text: str) -> Future:
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        return self.submit(text).result(timeout=self.timeout)
+
+    def embed_batch(self, texts: Sequence[str]) -> List[List[float]]:
+        return self.backend.embed_batch(texts)
+
+    def _drain(self) -> List[tuple]:
+        items = [self._queue.get()]  # block until there is work
+        deadline = time.monotonic() + self.max_wait
+        while len(items) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _worker(self) -> None:
+        while True:
+            items = self._drain()
+            try:
+                vectors = self.backend.embed_batch([text for text, _ in items])
+            except Exception as e:
+                logger.warning(f"Batched embedding of {len(items)} texts failed: {e}")
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            if len(vectors) != len(items):
+                # no way to tell which texts the vectors belong to: fail the whole batch
+                e = RuntimeError(f"Embedding backend returned {len(vectors)} vectors for {len(items)} texts")
+                logger.warning(str(e))
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(items, vectors):
+                future.set_result(vector)
+
+
+_BACKENDS = {
+    "deepsparse": DeepSparseBackend,
+    "optimum": OptimumBackend,
+}
+
+
+def get_embedding_backend(embedding_model_name: str) -> EmbeddingBackend:
+    """Build the backend selected by the "<prefix>:<model>" convention (no prefix -> Ollama)."""
+    prefix, sep, model = embedding_model_name.partition(":")
+    if sep and prefix in _BACKENDS:
+        logger.info(f"Using {prefix} embedding backend with model: {model}")
+        return _BACKENDS[prefix](model)
+    return OllamaBackend(embedding_model_name)
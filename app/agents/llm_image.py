@@ -2,11 +2,14 @@ import io
 import os
 import base64
 import time
+import asyncio
 import logging
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Union
+from typing import Any, Dict, List, Sequence, Union
 from PIL import Image
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 logger = logging.getLogger("OpenAIOCR")
 if not logger.handlers:
@@ -15,6 +18,10 @@ if not logger.handlers:
 DEFAULT_TIMEOUT = 180
 MAX_RETRIES = 3
 OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+B64_CHUNK_SIZE = 57 * 1024  # multiple of 3, so chunks encode without mid-stream padding
+PASSTHROUGH_MIME_TYPES = ("image/jpeg", "image/png")
+MAX_IMAGE_SIDE = 2048  # vision models gain nothing from larger inputs
+JPEG_QUALITY = 85
 
 class OpenAIOCR:
     """
@@ -41,23 +48,63 @@ class OpenAIOCR:
         self.retries = retries
         self.client = OpenAI(api_key=self.api_key)
 
+    @staticmethod
+    def _encode_file(path: Path) -> str:
+        """Base64-encode a file in fixed-size chunks instead of one full read."""
+        encoded = bytearray()
+        with open(path, "rb") as f:
+            while chunk := f.read(B64_CHUNK_SIZE):
+                encoded += base64.b64encode(chunk)
+        return encoded.decode("ascii")
+
+    @staticmethod
+    def _compress_image(image: Image.Image) -> str:
+        """
+        Downscale to MAX_IMAGE_SIDE and re-encode as JPEG (PNG only when the
+        image has transparency). Returns a base64 data URI.
+        """
+        if max(image.size) > MAX_IMAGE_SIDE:
+            scale = MAX_IMAGE_SIDE / max(image.size)
+            new_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(new_size, Image.LANCZOS)
+
+        buf = io.BytesIO()
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if has_alpha:
+            image.save(buf, format="PNG", optimize=True)
+            ext = "png"
+        else:
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.save(buf, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+            ext = "jpeg"
+
+        encoded = base64.b64encode(buf.getvalue()).decode("utf-8")
+        return f"data:image/{ext};base64,{encoded}"
+
     def _encode_image(self, image: Union[str, Path, bytes, Image.Image]) -> str:
         """Convert input image to base64 data URI."""
         if isinstance(image, (str, Path)):
             path = Path(image)
             if not path.exists():
                 raise FileNotFoundError(f"Image file not found: {path}")
-            with open(path, "rb") as f:
-                b = f.read()
-            ext = path.suffix.lstrip(".") or "png"
+            with Image.open(path) as img:
+                if max(img.size) > MAX_IMAGE_SIDE:
+                    return self._compress_image(img)
+            mime = mimetypes.guess_type(path.name)[0] or f"image/{path.suffix.lstrip('.') or 'png'}"
+            return f"data:{mime};base64,{self._encode_file(path)}"
         elif isinstance(image, bytes):
             b = image
-            ext = "png"
+            # Label JPEG bytes as JPEG (they are sent verbatim); PNG and anything else as before
+            ext = "jpeg" if b.startswith(b"\xff\xd8") else "png"
         elif isinstance(image, Image.Image):
-            buf = io.BytesIO()
-            image.save(buf, format="PNG")
-            b = buf.getvalue()
-            ext = "png"
+            # Images opened straight from a JPEG/PNG on disk are sent as-is, no PNG round-trip
+            source = getattr(image, "filename", "")
+            mime = mimetypes.guess_type(source)[0] if source else None
+            fits = max(image.size) <= MAX_IMAGE_SIDE
+            if fits and mime in PASSTHROUGH_MIME_TYPES and os.path.exists(source):
+                return f"data:{mime};base64,{self._encode_file(Path(source))}"
+            return self._compress_image(image)
         else:
             raise ValueError("Unsupported image type for OCR (expected Path, bytes, or PIL.Image).")
 
@@ -65,23 +112,16 @@ class OpenAIOCR:
         return f"data:image/{ext};base64,{encoded}"
 
     def _extract_content(self, response) -> str:
-        """Validate and extract OCR text content from the chat response."""
-        if response.choices and response.choices[0].message and response.choices[0].message.content:
-            content = response.choices[0].message.content.strip()
-        else:
-            raise RuntimeError("Invalid response: missing content in choices[0].message")
-        return content
+        """Validate and extract OCR text content from the chat response; empty content yields ''."""
+        if response.choices and response.choices[0].message:
+            # A blank page legitimately comes back with content "" (or None): return it as
+            # empty text so callers can retry/warn, instead of failing the request
+            return (response.choices[0].message.content or "").strip()
+        raise RuntimeError("Invalid response: missing choices[0].message")
 
-    def ocr(
-        self,
-        image: Union[str, Path, bytes, Image.Image],
-        user_prompt: str = "Extract Persian text and return it cleanly:",
-        max_tokens: int = 2048,
-        temperature: float = 0.1,
-    ) -> str:
-        """Send image to OpenAI and extract Persian text with retries and fallback."""
-        image_data_uri = self._encode_image(image)
-        messages = [
+    def _build_messages(self, image_data_uri: str, user_prompt: str) -> List[Dict[str, Any]]:
+        """Build the multimodal chat messages for one image."""
+        return [
             {"role": "system", "content": self.system_prompt},
             {
                 "role": "user",
@@ -92,6 +132,17 @@ class OpenAIOCR:
             },
         ]
 
+    def ocr(
+        self,
+        image: Union[str, Path, bytes, Image.Image],
+        user_prompt: str = "Extract Persian text and return it cleanly:",
+        max_tokens: int = 2048,
+        temperature: float = 0.1,
+    ) -> str:
+        """Send image to OpenAI and extract Persian text with retries and fallback."""
+        image_data_uri = self._encode_image(image)
+        messages = self._build_messages(image_data_uri, user_prompt)
+
         attempt = 0
         backoff = 3
         last_exception = None
@@ -122,4 +173,64 @@ class OpenAIOCR:
                 last_exception = e
                 break
 
-        raise RuntimeError(f"OCR failed after {self.retries} retries. Last error: {last_exception}")
\ No newline at end of file
+        raise RuntimeError(f"OCR failed after {self.retries} retries. Last error: {last_exception}")
+
+    async def ocr_batch(
+        self,
+        images: Sequence[Union[str, Path, bytes, Image.Image]],
+        user_prompt: str = "Extract Persian text and return it cleanly:",
+        max_tokens: int = 2048,
+        temperature: float = 0.1,
+        concurrency: int = 8,
+    ) -> List[Union[str, Exception]]:
+        """
+        OCR many images concurrently with at most `concurrency` requests in flight.
+        Results keep the input order; an image that fails after retries yields
+        its exception in place of the text.
+        """
+        loop = asyncio.get_running_loop()
+        sem = asyncio.Semaphore(concurrency)
+
+        async def _one(async_client: AsyncOpenAI, pool: ThreadPoolExecutor, image) -> str:
+            async with sem:
+                # base64 encoding is disk/CPU work, keep it off the event loop
+                image_data_uri = await loop.run_in_executor(pool, self._encode_image, image)
+                messages = self._build_messages(image_data_uri, user_prompt)
+
+                attempt = 0
+                backoff = 3
+                last_exception = None
+
+                while attempt < self.retries:
+                    attempt += 1
+                    try:
+                        response = await async_client.chat.completions.create(
+                            model=self.model,
+                            messages=messages,
+                            max_tokens=max_tokens,
+                            temperature=temperature,
+                        )
+                        text = self._extract_content(response)
+                        if not text:
+                            logger.warning("Empty OCR result (attempt %d)", attempt)
+                        return text
+
+                    except Exception as e:
+                        status = getattr(e, "status_code", "Unknown")
+                        logger.error("Error on attempt %d: %s", attempt, e)
+                        last_exception = e
+
+                        if status in (429, 500, 502, 503, 504):
+                            await asyncio.sleep(backoff)
+                            backoff *= 2
+                            continue
+                        break
+
+                raise RuntimeError(f"OCR failed after {self.retries} retries. Last error: {last_exception}")
+
+        async with AsyncOpenAI(api_key=self.api_key, timeout=self.timeout) as async_client:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                return await asyncio.gather(
+                    *(_one(async_client, pool, image) for image in images),
+                    return_exceptions=True,
+                )
@@ -1,5 +1,5 @@
 # local_llm.py
-from typing import Optional, Any, Dict, List
+from typing import Optional, Any, AsyncIterator, Dict, List
 import logging
 import ollama
 
@@ -14,6 +14,16 @@ class LocalLLM:
     ) -> None:
         self.model_name = model_name
         self.system_prompt = system_prompt
+        # Persistent clients keep the connection to the Ollama daemon alive between calls
+        self._client = ollama.Client()
+        self._aclient = ollama.AsyncClient()
+
+    def warmup(self) -> None:
+        """Load the model into Ollama's memory; an empty prompt loads it without generating."""
+        try:
+            self._client.generate(model=self.model_name, prompt="")
+        except Exception as e:
+            logger.warning("Ollama warmup for %s failed: %s", self.model_name, e)
 
     def _build_messages(self, prompt: str, extra_system: Optional[str] = None) -> List[Dict[str, str]]:
         sys_text = self.system_prompt or ""
@@ -51,14 +61,14 @@ class LocalLLM:
         # fallback: stringify the object
         return str(response)
 
-    def chat(
+    def _build_call_kwargs(
         self,
         prompt: str,
-        extra_system: Optional[str] = None,
-        temperature: Optional[float] = None,
-        max_tokens: Optional[int] = None,
-        **kwargs,
-    ) -> str:
+        extra_system: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        kwargs: Dict[str, Any],
+    ) -> Dict[str, Any]:
         messages = self._build_messages(prompt, extra_system)
         call_kwargs: Dict[str, Any] = {"model": self.model_name, "messages": messages}
         if temperature is not None:
@@ -66,19 +76,76 @@ class LocalLLM:
         if max_tokens is not None:
             call_kwargs["max_tokens"] = max_tokens
         call_kwargs.update(kwargs)
+        return call_kwargs
+
+    def chat(
+        self,
+        prompt: str,
+        extra_system: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        **kwargs,
+    ) -> str:
+        call_kwargs = self._build_call_kwargs(prompt, extra_system, temperature, max_tokens, kwargs)
 
         try:
             logger.debug("Calling ollama.chat with args: %s", call_kwargs)
-            response = ollama.chat(**call_kwargs)
+            response = self._client.chat(**call_kwargs)
             answer = self._extract_answer(response)
             return answer.strip()
         except Exception as e:
             logger.exception("Error calling ollama.chat: %s", e)
             raise
 
+    async def achat(
+        self,
+        prompt: str,
+        extra_system: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        **kwargs,
+    ) -> str:
+        """
+        Async variant of chat; many prompts can be awaited together with asyncio.gather.
+        """
+        call_kwargs = self._build_call_kwargs(prompt, extra_system, temperature, max_tokens, kwargs)
+
+        try:
+            logger.debug("Calling ollama.AsyncClient.chat with args: %s", call_kwargs)
+            response = await self._aclient.chat(**call_kwargs)
+            answer = self._extract_answer(response)
+            return answer.strip()
+        except Exception as e:
+            logger.exception("Error calling ollama.AsyncClient.chat: %s", e)
+            raise
+
+    async def astream_chat(
+        self,
+        prompt: str,
+        extra_system: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        **kwargs,
+    ) -> AsyncIterator[str]:
+        """
+        Yield the reply piece by piece as Ollama decodes it.
+        """
+        call_kwargs = self._build_call_kwargs(prompt, extra_system, temperature, max_tokens, kwargs)
+        call_kwargs["stream"] = True
+
+        try:
+            logger.debug("Streaming ollama.AsyncClient.chat with args: %s", call_kwargs)
+            async for part in await self._aclient.chat(**call_kwargs):
+                piece = self._extract_answer(part)
+                if piece:
+                    yield piece
+        except Exception as e:
+            logger.exception("Error streaming ollama.AsyncClient.chat: %s", e)
+            raise
+
     def chat_raw(self, **call_kwargs) -> Any:
         try:
-            return ollama.chat(**call_kwargs)
+            return self._client.chat(**call_kwargs)
         except Exception as e:
             logger.exception("Error in chat_raw: %s", e)
             raise
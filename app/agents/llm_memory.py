@@ -1,30 +1,130 @@
 """
 agents/llm_memory.py
 
-MemoryAgent manages user & session-specific memory using ChromaDB + Ollama embeddings.
+MemoryAgent manages user & session-specific memory using ChromaDB + Ollama embeddings
+(or another backend from agents/llm_embedding.py, chosen by embedding_model_name prefix).
 It provides safe helpers for querying and deleting memory using Chroma's expected 'where' format.
 """
 
+import asyncio
+import atexit
 import chromadb
+import collections
 import uuid
 import datetime
-import json
+import functools
 import logging
+import os
 import re
-from typing import List, Dict, Any, Optional
-import ollama  # Ollama embeddings engine
+import threading
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+import numpy as np
+import orjson
+from cachetools import TTLCache
+from app.agents.llm_embedding import EmbeddingBatcher, get_embedding_backend
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
+_SPLIT_RE = re.compile(r"[.!؟?]\s*")
+_KEYWORD_RE = re.compile(r"است|می‌شود|دارد|هست|باید")
+MIN_SUMMARY_INPUT = 64  # shorter texts are stored as-is
+# A caller-supplied message embedding stands in for the summary's only when the summary
+# is this short; longer summaries drift from the message and are embedded themselves
+EMBEDDING_REUSE_MAX_CHARS = 256
+# Collection metadata flag: every stored embedding is unit-norm (see _normalize_stored_embeddings)
+UNIT_NORM_FLAG = "embeddings_unit_norm"
+NORMALIZE_PAGE_SIZE = 1000
+
+
+class _SimilarityRing:
+    """
+    Fixed-capacity ring of unit-norm query vectors and their results; insert and evict are O(1).
+    Always float32: float16 matmul has no BLAS kernel in numpy and runs ~30x slower.
+    """
+
+    def __init__(self, capacity: int, dim: int):
+        self.vecs = np.empty((capacity, dim), dtype=np.float32)
+        self.payloads: List[Optional[List[str]]] = [None] * capacity
+        self.size = 0
+        self.pos = 0
+
+    def best(self, q: np.ndarray) -> Tuple[float, Optional[List[str]]]:
+        if not self.size:
+            return -1.0, None
+        sims = self.vecs[:self.size] @ q  # one BLAS gemv; rows are unit-norm, so this is cosine
+        i = int(sims.argmax())
+        return float(sims[i]), self.payloads[i]
+
+    def add(self, q: np.ndarray, payload: List[str]) -> None:
+        self.vecs[self.pos] = q
+        self.payloads[self.pos] = payload
+        self.pos = (self.pos + 1) % len(self.payloads)
+        self.size = min(self.size + 1, len(self.payloads))
+
 
 class MemoryAgent:
     """Memory system for multi-session user chat using Chroma + Ollama embeddings."""
 
-    def __init__(self, persist_dir: str = "./chroma_memory", embedding_model_name: str = "nomic-embed-text"):
+    def __init__(
+        self,
+        persist_dir: str = "./chroma_memory",
+        embedding_model_name: str = "nomic-embed-text",
+        embed_cache_size: int = 4096,
+        similarity_threshold: float = 0.97,
+        similarity_cache_size: int = 64,
+        flush_interval: float = 0.2,
+        flush_batch_size: int = 100,
+        embed_batch_wait_ms: float = 10,
+        embed_max_batch: int = 32,
+        embedding_dtype: str = "float16",
+        context_cache_size: int = 2048,
+        context_cache_ttl: float = 60,
+    ):
         self.client = chromadb.PersistentClient(path=persist_dir)
         self.collection = self.client.get_or_create_collection(name="user_memories")
         self.embedding_model_name = embedding_model_name
+        # Vectors are L2-normalized before they reach Chroma (l2 space): the batched Ollama
+        # endpoint returns unit-norm vectors, older rows hold raw /api/embeddings vectors
+        self._normalize_stored_embeddings()
+        # Concurrent requests (FastAPI runs generate_answer in worker threads) share one batched backend call
+        self._backend = EmbeddingBatcher(
+            get_embedding_backend(embedding_model_name),
+            max_wait_ms=embed_batch_wait_ms,
+            max_batch=embed_max_batch,
+        )
+
+        # Embeddings in the LRU and write-behind queue (what is sent to Chroma) use this dtype;
+        # float16 halves their footprint vs float32, set "float32" to roll back.
+        # The similarity cache is float32 regardless, since it is scanned with a matmul.
+        self.embedding_dtype = np.dtype(embedding_dtype)
+
+        # Tier 1: exact-text LRU in front of Ollama (per instance, so the model is part of the key)
+        self._embed_cached = functools.lru_cache(maxsize=embed_cache_size)(self._embed_uncached)
+
+        # Tier 2: per (user_id, session_id, top_k) ring of unit-norm query embeddings
+        # and their retrieve_memory results; near-duplicate queries reuse the results
+        self.similarity_threshold = similarity_threshold
+        self.similarity_cache_size = similarity_cache_size
+        self._sim_cache: Dict[Tuple[Optional[str], Optional[str], int], _SimilarityRing] = {}
+        self._sim_lock = threading.Lock()
+
+        # Tier 3: finished build_context_for_prompt strings (retry / repeated follow-up).
+        # Keys carry a write version (per user, or global for user-less scopes) that
+        # store/delete bump, so stale entries are simply never looked up again.
+        self._context_cache: TTLCache = TTLCache(maxsize=context_cache_size, ttl=context_cache_ttl)
+        self._context_versions: Dict[Optional[str], int] = {}
+        self._context_lock = threading.Lock()
+
+        # Write-behind buffer: store_memory enqueues, a background thread adds to Chroma in batches
+        self.flush_interval = flush_interval
+        self.flush_batch_size = flush_batch_size
+        self._pending: collections.deque = collections.deque()
+        self._flush_lock = threading.Lock()
+        self._flush_wakeup = threading.Event()
+        threading.Thread(target=self._flush_loop, name="memory-writer", daemon=True).start()
+        atexit.register(self.flush)
+
         logger.info(f"MemoryAgent initialized with model: {embedding_model_name}")
 
     # ----------------------------- Helper for where clause -----------------------------
@@ -34,7 +134,13 @@ class MemoryAgent:
         - both user_id+session_id -> {"$and": [{"user_id": ...}, {"session_id": ...}]}
         - single -> {"user_id": ...} or {"session_id": ...}
         - none -> {}
+        The same (user_id, session_id) pair returns the same cached dict; treat it as read-only.
         """
+        return self._cached_where_clause(user_id, session_id)
+
+    @staticmethod
+    @functools.lru_cache(maxsize=4096)
+    def _cached_where_clause(user_id: Optional[str], session_id: Optional[str]) -> Dict[str, Any]:
         if user_id and session_id:
             return {"$and": [{"user_id": user_id}, {"session_id": session_id}]}
         if user_id:
@@ -44,53 +150,83 @@ class MemoryAgent:
         return {}
 
     # ----------------------------- Store Memory -----------------------------
-    def store_memory(self, user_id: str, session_id: str, text: str) -> str:
-        """Summarize and store chat message in memory with metadata (user_id + session_id)."""
+    def store_memory(
+        self, user_id: str, session_id: str, text: str, embedding: Optional[Sequence[float]] = None
+    ) -> str:
+        """
+        Summarize and store chat message in memory with metadata (user_id + session_id).
+        `embedding` (e.g. from aembed(message), already used for retrieval) saves a second
+        embedding call for short summaries.
+        """
         if not text or not text.strip():
             return ""
 
         summary = self._summarize_text(text)
-        emb = self._embed(summary)
+        if embedding is not None and len(summary) <= EMBEDDING_REUSE_MAX_CHARS:
+            emb = self._unit(embedding)
+        else:
+            emb = self._embed_cached(summary)
         mem_id = str(uuid.uuid4())
         timestamp = datetime.datetime.utcnow().isoformat()
 
-        self.collection.add(
-            documents=[summary],
-            embeddings=[emb],
-            metadatas=[{
-                "user_id": user_id,
-                "session_id": session_id,
-                "timestamp": timestamp
-            }],
-            ids=[mem_id],
-        )
+        self._pending.append((mem_id, summary, emb, {
+            "user_id": user_id,
+            "session_id": session_id,
+            "timestamp": timestamp
+        }))
+        if len(self._pending) >= self.flush_batch_size:
+            self._flush_wakeup.set()
+        self._invalidate_caches(user_id, session_id)
 
-        logger.info(f"Stored memory (id={mem_id}) user={user_id} session={session_id}")
+        logger.info(f"Queued memory (id={mem_id}) user={user_id} session={session_id}")
         return mem_id
 
     # ----------------------------- Retrieve Memory -----------------------------
-    def retrieve_memory(self, user_id: Optional[str], session_id: Optional[str], query: str, top_k: int = 5) -> List[str]:
+    def retrieve_memory(
+        self,
+        user_id: Optional[str],
+        session_id: Optional[str],
+        query: str,
+        top_k: int = 5,
+        embedding: Optional[Sequence[float]] = None,
+    ) -> List[str]:
         """
         Retrieve the most relevant memories for a given user & session and query.
         Both user_id and session_id are optional (but recommended).
+        Pass a precomputed query `embedding` to skip embedding the query again.
         """
-        emb = self._embed(query)
+        emb = self._embed_cached(query) if embedding is None else self._unit(embedding)
+        scope = (user_id, session_id, top_k)
+        q = emb.astype(np.float32)
+        q /= np.linalg.norm(q) or 1.0
+
+        cached = self._lookup_similar(scope, q)
+        if cached is not None:
+            logger.debug(f"Similarity cache hit for scope={scope}")
+            return list(cached)
+
+        self.flush()  # read-your-writes: queued memories must be visible to the query
+
         where_clause = self._build_where_clause(user_id=user_id, session_id=session_id)
         logger.debug(f"Querying memories where={where_clause} n_results={top_k}")
         results = self.collection.query(
-            query_embeddings=[emb],
+            query_embeddings=[emb.tolist()],
             n_results=top_k,
-            where=where_clause
+            where=where_clause,
+            include=["documents"],  # metadatas/distances are not used here
         )
-        docs = results.get("documents", [[]])[0]
-        return docs or []
+        docs = results.get("documents", [[]])[0] or []
+        self._remember_similar(scope, q, docs)
+        return docs
 
     # ----------------------------- Export user/session memory -----------------------------
     def export_user_memory(self, user_id: str, session_id: Optional[str] = None) -> List[Dict[str, Any]]:
         """Return all memories for a user or for a specific session."""
+        self.flush()
         where_clause = self._build_where_clause(user_id=user_id, session_id=session_id)
         logger.debug(f"Exporting memory where={where_clause}")
-        results = self.collection.get(where=where_clause)
+        # ids always come back; never pull embeddings for an export
+        results = self.collection.get(where=where_clause, include=["documents", "metadatas"])
         data = []
         for doc, meta, mid in zip(results.get("documents", []), results.get("metadatas", []), results.get("ids", [])):
             data.append({
@@ -107,13 +243,13 @@ class MemoryAgent:
     ) -> str:
         """Export user/session memory as JSON string and optionally save to disk."""
         data = self.export_user_memory(user_id, session_id)
-        json_data = json.dumps(data, ensure_ascii=False, indent=2)
+        json_bytes = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
 
         if file_path:
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write(json_data)
+            with open(file_path, "wb") as f:
+                f.write(json_bytes)
             logger.info(f"Exported memory → {file_path}")
-        return json_data
+        return json_bytes.decode("utf-8")
 
     # ----------------------------- Delete Memory -----------------------------
     def delete_memory(self, user_id: Optional[str] = None, session_id: Optional[str] = None) -> Dict[str, Any]:
@@ -125,32 +261,186 @@ class MemoryAgent:
         where_clause = self._build_where_clause(user_id=user_id, session_id=session_id)
         if not where_clause:
             raise ValueError("Refusing to delete with empty filters. Provide user_id and/or session_id.")
+        self.flush()  # otherwise queued memories would be added back after the delete
         logger.info(f"Deleting memories where={where_clause}")
         self.collection.delete(where=where_clause)
-        return {"status": "deleted", "where": where_clause}
+        self._invalidate_caches(user_id, session_id)
+        return {"status": "deleted", "where": dict(where_clause)}
+
+    # ----------------------------- Write-behind flushing -----------------------------
+    def flush(self) -> None:
+        """Add every queued memory to Chroma, in batches of flush_batch_size."""
+        with self._flush_lock:
+            batch = []
+            while self._pending:
+                batch.append(self._pending.popleft())
+            for start in range(0, len(batch), self.flush_batch_size):
+                part = batch[start:start + self.flush_batch_size]
+                ids, documents, embeddings, metadatas = map(list, zip(*part))
+                embeddings = [e.tolist() for e in embeddings]
+                try:
+                    self.collection.add(documents=documents, embeddings=embeddings, metadatas=metadatas, ids=ids)
+                except Exception:
+                    # Put the unwritten items back so the next flush retries them
+                    self._pending.extendleft(reversed(batch[start:]))
+                    raise
+            if batch:
+                logger.debug(f"Flushed {len(batch)} memories to Chroma")
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._flush_wakeup.wait(self.flush_interval)
+            self._flush_wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Background memory flush failed: {e}")
 
     # ----------------------------- Build memory context for prompt -----------------------------
-    def build_context_for_prompt(self, user_id: Optional[str], session_id: Optional[str], query: str, max_memories: int = 5) -> str:
+    def build_context_for_prompt(
+        self,
+        user_id: Optional[str],
+        session_id: Optional[str],
+        query: str,
+        max_memories: int = 5,
+        embedding: Optional[Sequence[float]] = None,
+    ) -> str:
         """
         Build memory context block for LLM prompt using session-aware retrieval.
         If no memories found, returns a polite default message.
+        Results are cached for context_cache_ttl seconds until the user's memories change.
         """
-        memories = self.retrieve_memory(user_id=user_id, session_id=session_id, query=query, top_k=max_memories)
+        with self._context_lock:
+            key = (user_id, session_id, query.strip(), max_memories, self._context_versions.get(user_id, 0))
+            cached = self._context_cache.get(key)
+        if cached is not None:
+            return cached
+
+        memories = self.retrieve_memory(
+            user_id=user_id, session_id=session_id, query=query, top_k=max_memories, embedding=embedding
+        )
         if not memories:
-            return "هیچ پیش‌زمینه‌ای از مکالمات قبلی در این نشست وجود ندارد."
+            context_block = "هیچ پیش‌زمینه‌ای از مکالمات قبلی در این نشست وجود ندارد."
+        else:
+            context = "\n".join([f"- {m}" for m in memories])
+            context_block = f"سوابق گفتگو در این نشست:\n{context}\n"
 
-        context = "\n".join([f"- {m}" for m in memories])
-        return f"سوابق گفتگو در این نشست:\n{context}\n"
+        with self._context_lock:
+            self._context_cache[key] = context_block
+        return context_block
 
     # ----------------------------- Internal Utilities -----------------------------
     def _summarize_text(self, text: str) -> str:
         """Simple rule-based summarization for Persian."""
-        sentences = re.split(r"[.!؟?]\s*", text.strip())
-        important = [s for s in sentences if len(s.split()) > 4 and any(v in s for v in ["است", "می‌شود", "دارد", "هست", "باید"])]
+        text = text.strip()
+        if len(text) < MIN_SUMMARY_INPUT:
+            return text
+        sentences = _SPLIT_RE.split(text)
+        important = [s for s in sentences if len(s.split()) > 4 and _KEYWORD_RE.search(s) is not None]
         summary = " ".join(important[:2]) if important else (sentences[0] if sentences else text)
         return summary.strip()
 
+    def embed(self, text: str) -> np.ndarray:
+        """Embedding of text through the cached path (read-only array in embedding_dtype)."""
+        return self._embed_cached(text)
+
+    async def aembed(self, text: str) -> np.ndarray:
+        """Embed once per chat turn from async code; pass the result to retrieve/store as `embedding`."""
+        return await asyncio.to_thread(self._embed_cached, text)
+
     def _embed(self, text: str) -> List[float]:
-        """Generate embedding using Ollama (sync call)."""
-        response = ollama.embeddings(model=self.embedding_model_name, prompt=text)
-        return response["embedding"]
+        """Generate embedding, served from the exact-text LRU when possible."""
+        return self._embed_cached(text).tolist()
+
+    def _embed_uncached(self, text: str) -> np.ndarray:
+        """Generate embedding with the configured backend (sync call), as a read-only array."""
+        emb = self._unit(self._backend.embed(text))
+        emb.setflags(write=False)  # shared through the LRU, so never mutate in place
+        return emb
+
+    def _unit(self, vec: Sequence[float]) -> np.ndarray:
+        """L2-normalized copy of vec (computed in float32) in embedding_dtype."""
+        v = np.asarray(vec, dtype=np.float32)
+        return (v / (np.linalg.norm(v) or 1.0)).astype(self.embedding_dtype)
+
+    def _normalize_stored_embeddings(self) -> None:
+        """
+        One-time pass over user_memories: rescale rows that are not unit-norm (written before
+        normalization). Normalizing a raw /api/embeddings vector gives the /api/embed vector,
+        so this equals re-embedding without the Ollama calls. Marked done in collection metadata.
+        """
+        meta = dict(self.collection.metadata or {})
+        if meta.get(UNIT_NORM_FLAG):
+            return
+        offset = fixed = 0
+        while True:
+            page = self.collection.get(include=["embeddings"], limit=NORMALIZE_PAGE_SIZE, offset=offset)
+            ids = page["ids"]
+            if not ids:
+                break
+            vecs = np.asarray(page["embeddings"], dtype=np.float32)
+            norms = np.linalg.norm(vecs, axis=1)
+            stale = (np.abs(norms - 1.0) > 1e-3) & (norms > 0)
+            if stale.any():
+                self.collection.update(
+                    ids=[i for i, s in zip(ids, stale) if s],
+                    embeddings=(vecs[stale] / norms[stale, None]).tolist(),
+                )
+                fixed += int(stale.sum())
+            offset += len(ids)
+        try:
+            # hnsw:* keys cannot be changed after creation; keep only the plain metadata
+            meta = {k: v for k, v in meta.items() if not k.startswith("hnsw:")}
+            self.collection.modify(metadata={**meta, UNIT_NORM_FLAG: True})
+        except Exception as e:
+            logger.warning(f"Could not mark user_memories as normalized (pass repeats next start): {e}")
+        if fixed:
+            logger.info(f"Normalized {fixed} stored memory embeddings")
+
+    def _lookup_similar(self, scope: Tuple, q: np.ndarray) -> Optional[List[str]]:
+        """Return cached results of the most similar earlier query in scope, if above threshold."""
+        with self._sim_lock:
+            ring = self._sim_cache.get(scope)
+            if ring is None or ring.vecs.shape[1] != q.shape[0]:
+                return None
+            sim, docs = ring.best(q)
+            return docs if sim > self.similarity_threshold else None
+
+    def _remember_similar(self, scope: Tuple, q: np.ndarray, docs: List[str]) -> None:
+        with self._sim_lock:
+            ring = self._sim_cache.get(scope)
+            if ring is None or ring.vecs.shape[1] != q.shape[0]:
+                ring = _SimilarityRing(self.similarity_cache_size, q.shape[0])
+                self._sim_cache[scope] = ring
+            ring.add(q, list(docs))  # overwrites the oldest entry once full
+
+    def _invalidate_caches(self, user_id: Optional[str], session_id: Optional[str]) -> None:
+        """Drop cached results for every scope the changed memories could appear in (None matches all)."""
+        def overlaps(a: Optional[str], b: Optional[str]) -> bool:
+            return a is None or b is None or a == b
+
+        with self._sim_lock:
+            for scope in [s for s in self._sim_cache if overlaps(s[0], user_id) and overlaps(s[1], session_id)]:
+                del self._sim_cache[scope]
+
+        with self._context_lock:
+            # User-less scopes span every user, so any write bumps the global (None) version
+            self._context_versions[None] = self._context_versions.get(None, 0) + 1
+            if user_id is None:
+                self._context_cache.clear()  # owner unknown: every user's entries may be stale
+            else:
+                self._context_versions[user_id] = self._context_versions.get(user_id, 0) + 1
+
+
+# ----------------------------- Shared instance -----------------------------
+def get_memory_agent(persist_dir: str = "./chroma_memory") -> MemoryAgent:
+    """
+    Process-wide MemoryAgent per persist_dir, so routers and the engine share one
+    Chroma client (one index in RAM, one writer thread) instead of opening the path twice.
+    """
+    return _memory_agent_for(os.path.abspath(persist_dir))
+
+
+@functools.lru_cache(maxsize=None)
+def _memory_agent_for(persist_dir: str) -> MemoryAgent:
+    return MemoryAgent(persist_dir=persist_dir)
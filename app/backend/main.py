@@ -1,8 +1,47 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from app.generation.engine import RAGAssistant
 from .routers import memory, sessions, knowledge, chat
 
-app = FastAPI(title="RAINA API", version="1.0")
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+CONFIG_FILE = BASE_DIR / "config" / "config.yaml"
+
+
+# ======================================
+# Lifespan: build the RAG singleton and warm models before serving traffic
+# ======================================
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    assistant = RAGAssistant(config_file=CONFIG_FILE, use_local_llm=False)
+    app.state.assistant = assistant
+    # Same shared instance the memory/sessions routers use (get_memory_agent)
+    app.state.memory_agent = assistant.memory_agent
+
+    warmups = await asyncio.gather(
+        asyncio.to_thread(assistant.memory_agent._embed, "warmup"),
+        assistant.awarmup(),  # retrieval stores, query embedding and the LLM connection
+        return_exceptions=True,
+    )
+    for result in warmups:
+        if isinstance(result, Exception):
+            logger.warning("Warmup failed: %s", result)
+
+    yield
+
+    # Let background turn writes finish, then write out memories still queued in the Chroma writer
+    await assistant.aclose()
+    app.state.memory_agent.flush()
+
+
+app = FastAPI(title="RAINA API", version="1.0", default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # ======================================
 # CORS settings for Streamlit on localhost
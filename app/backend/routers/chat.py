@@ -1,14 +1,11 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
 import uuid
-from datetime import datetime
 import logging
-import asyncio
-from pathlib import Path
-
-# Import your RAGAssistant
-from app.generation.engine import RAGAssistant
+import orjson
+from app.backend.session_store import now_iso, session_store
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 logger = logging.getLogger(__name__)
@@ -19,53 +16,64 @@ class ChatRequest(BaseModel):
     session_id: Optional[str] = None
     use_subqueries: Optional[bool] = True  # optional for splitting complex queries
 
-# Initialize RAGAssistant once (singleton)
-BASE_DIR = Path(__file__).resolve().parent.parent.parent
-CONFIG_FILE = BASE_DIR / "config" / "config.yaml"
-
-assistant = RAGAssistant(config_file=CONFIG_FILE, use_local_llm=False)
-
-# In-memory session store
-_sessions = {}
-
 @router.post("")
-async def chat(req: ChatRequest):
+async def chat(req: ChatRequest, request: Request):
     """
     Handle a chat message using RAGAssistant and return response.
+    The assistant singleton is created in the app lifespan (see main.py).
     """
+    assistant = request.app.state.assistant
     user_id = req.user_id
     message = req.message
     session_id = req.session_id or str(uuid.uuid4())
     use_subqueries = req.use_subqueries
 
-    now = datetime.utcnow().isoformat()
-    if session_id not in _sessions:
-        _sessions[session_id] = {
-            "session_id": session_id,
-            "user_id": user_id,
-            "title": "Chat",
-            "last_message": "",
-            "updated_at": now,
-        }
+    now = now_iso()
+    session_store.create(session_id, user_id, "Chat", now)
 
     logger.info(f"CHAT request user={user_id} session={session_id} message={message[:120]}")
 
     try:
-        # Use asyncio.to_thread because generate_answer is blocking
-        reply = await asyncio.to_thread(
-            assistant.generate_answer,
-            message
-        )
+        reply = await assistant.generate_answer_async(message)
     except Exception as e:
         logger.exception("Error generating RAG response for user=%s session=%s: %s", user_id, session_id, e)
         raise HTTPException(status_code=500, detail=str(e))
 
     # Update session metadata
-    _sessions[session_id]["last_message"] = message
-    _sessions[session_id]["updated_at"] = datetime.utcnow().isoformat()
+    session_store.update_last_message(session_id, message, now_iso())
 
     return {
         "session_id": session_id,
         "reply": reply,
         "retrieved_docs": None  # optionally, you can modify assistant to return docs
     }
+
+
+@router.post("/stream")
+async def chat_stream(req: ChatRequest, request: Request):
+    """
+    Stream the reply as Server-Sent Events: `data: {"token": ...}` frames, then `data: [DONE]`.
+    The session id is returned in the X-Session-Id header.
+    """
+    assistant = request.app.state.assistant
+    user_id = req.user_id
+    message = req.message
+    session_id = req.session_id or str(uuid.uuid4())
+
+    session_store.create(session_id, user_id, "Chat", now_iso())
+    logger.info(f"CHAT stream user={user_id} session={session_id} message={message[:120]}")
+
+    async def events():
+        try:
+            async for piece in assistant.stream_answer(message):
+                yield f"data: {orjson.dumps({'token': piece}).decode()}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            # Update session metadata once the stream has ended (or the client went away)
+            session_store.update_last_message(session_id, message, now_iso())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"X-Session-Id": session_id, "Cache-Control": "no-cache"},
+    )
@@ -4,11 +4,11 @@ FastAPI endpoints for managing user & session-specific memories using MemoryAgen
 """
 
 from fastapi import APIRouter, HTTPException, Query
-from app.agents.llm_memory import MemoryAgent
+from app.agents.llm_memory import get_memory_agent
 from typing import Optional
 
 router = APIRouter(prefix="/api/memory", tags=["memory"])
-memory_agent = MemoryAgent(persist_dir="./chroma_memory")
+memory_agent = get_memory_agent(persist_dir="./chroma_memory")
 
 
 @router.get("/{user_id}")
@@ -6,19 +6,15 @@ Now integrated with MemoryAgent to delete/clear session-specific memories safely
 
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel
-from datetime import datetime
 from typing import List, Dict, Optional
 import uuid
-from app.agents.llm_memory import MemoryAgent
+from app.agents.llm_memory import get_memory_agent
+from app.backend.session_store import now_iso, session_store
 
 router = APIRouter(prefix="/api/sessions", tags=["sessions"])
 
 # ----------------------------- Memory integration -----------------------------
-memory_agent = MemoryAgent(persist_dir="./chroma_memory")
-
-# ----------------------------- In-memory store (can be replaced by DB) -----------------------------
-_sessions: Dict[str, Dict] = {}
-
+memory_agent = get_memory_agent(persist_dir="./chroma_memory")
 
 # ----------------------------- Schemas -----------------------------
 class NewSessionRequest(BaseModel):
@@ -32,17 +28,12 @@ class UpdateSessionRequest(BaseModel):
 
 # ----------------------------- Endpoints -----------------------------
 @router.get("")
-def list_sessions(user_id: Optional[str] = Query(None)) -> List[Dict]:
+def list_sessions(user_id: Optional[str] = Query(None), limit: Optional[int] = Query(None, ge=1)) -> List[Dict]:
     """
-     Get all active chat sessions (for sidebar)
+     Get all active chat sessions (for sidebar), newest first
     Optionally filtered by user_id
     """
-    sessions = list(_sessions.values())
-    if user_id:
-        sessions = [s for s in sessions if s["user_id"] == user_id]
-
-    sessions.sort(key=lambda s: s["updated_at"], reverse=True)
-    return sessions
+    return session_store.list(user_id=user_id, limit=limit)
 
 
 @router.post("")
@@ -51,17 +42,8 @@ def create_session(req: NewSessionRequest):
      Create a new chat session for a user
     """
     session_id = str(uuid.uuid4())
-    now = datetime.utcnow().isoformat()
-
-    _sessions[session_id] = {
-        "session_id": session_id,
-        "user_id": req.user_id,
-        "title": req.title,
-        "last_message": "",
-        "updated_at": now,
-    }
-
-    return _sessions[session_id]
+    now = now_iso()
+    return session_store.create(session_id, req.user_id, req.title, now)
 
 
 @router.get("/{session_id}")
@@ -69,7 +51,7 @@ def get_session(session_id: str):
     """
      Get session details
     """
-    session = _sessions.get(session_id)
+    session = session_store.get(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     return session
@@ -80,12 +62,8 @@ def update_session(session_id: str, req: UpdateSessionRequest):
     """
      Update session last_message and timestamp (called after each chat message)
     """
-    session = _sessions.get(session_id)
-    if not session:
+    if not session_store.update_last_message(session_id, req.message, now_iso()):
         raise HTTPException(status_code=404, detail="Session not found")
-
-    session["last_message"] = req.message
-    session["updated_at"] = datetime.utcnow().isoformat()
     return {"status": "updated", "session_id": session_id}
 
 
@@ -94,7 +72,7 @@ def delete_session(session_id: str):
     """
      Delete a session and its associated memory (session-specific)
     """
-    session = _sessions.pop(session_id, None)
+    session = session_store.delete(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
@@ -115,7 +93,7 @@ def clear_session_memory(session_id: str):
      Clear memory for this session without deleting the session itself.
     Equivalent to "New Chat" button.
     """
-    session = _sessions.get(session_id)
+    session = session_store.get(session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
@@ -124,6 +102,5 @@ def clear_session_memory(session_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    session["last_message"] = ""
-    session["updated_at"] = datetime.utcnow().isoformat()
+    session_store.update_last_message(session_id, "", now_iso())
     return {"status": "cleared", "session_id": session_id}
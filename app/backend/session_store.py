@@ -0,0 +1,110 @@
+"""
+backend/session_store.py
+SQLite-backed chat session store shared by the chat and sessions routers.
+WAL mode lets readers run alongside the writer; the (user_id, updated_at DESC)
+index serves the sidebar listing in order without sorting in Python.
+"""
+
+import datetime
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id   TEXT PRIMARY KEY,
+    user_id      TEXT NOT NULL,
+    title        TEXT NOT NULL,
+    last_message TEXT NOT NULL DEFAULT '',
+    updated_at   TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_user_updated ON sessions(user_id, updated_at DESC);
+CREATE INDEX IF NOT EXISTS idx_updated ON sessions(updated_at DESC);
+"""
+
+COLUMNS = "session_id, user_id, title, last_message, updated_at"
+
+# (epoch second, ISO string) of the last formatted timestamp; replaced as one tuple so
+# concurrent readers never see a mismatched pair
+_ts_cache = (0, "")
+
+
+def now_iso() -> str:
+    """UTC ISO timestamp at second resolution, formatted at most once per second."""
+    global _ts_cache
+    sec = int(time.time())
+    cached_sec, cached_iso = _ts_cache
+    if sec != cached_sec:
+        cached_iso = datetime.datetime.utcfromtimestamp(sec).isoformat()
+        _ts_cache = (sec, cached_iso)
+    return cached_iso
+
+
+class SessionStore:
+    """Session rows in SQLite; one connection per thread (FastAPI runs sync handlers in a pool)."""
+
+    def __init__(self, db_path: str = "./sessions.db"):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def create(self, session_id: str, user_id: str, title: str, updated_at: str) -> Dict:
+        """Insert a session if it does not exist yet and return the stored row."""
+        with self._conn() as conn:
+            conn.execute(
+                f"INSERT OR IGNORE INTO sessions ({COLUMNS}) VALUES (?, ?, ?, '', ?)",
+                (session_id, user_id, title, updated_at),
+            )
+        return self.get(session_id)
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        row = self._conn().execute(
+            f"SELECT {COLUMNS} FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def list(self, user_id: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """Sessions newest first, optionally for one user; limit=None returns all."""
+        limit = -1 if limit is None else limit  # SQLite: negative LIMIT means no limit
+        if user_id:
+            rows = self._conn().execute(
+                f"SELECT {COLUMNS} FROM sessions WHERE user_id = ? ORDER BY updated_at DESC LIMIT ?",
+                (user_id, limit),
+            )
+        else:
+            rows = self._conn().execute(
+                f"SELECT {COLUMNS} FROM sessions ORDER BY updated_at DESC LIMIT ?", (limit,)
+            )
+        return [dict(r) for r in rows]
+
+    def update_last_message(self, session_id: str, message: str, updated_at: str) -> bool:
+        """Set last_message/updated_at; returns False if the session does not exist."""
+        with self._conn() as conn:
+            cur = conn.execute(
+                "UPDATE sessions SET last_message = ?, updated_at = ? WHERE session_id = ?",
+                (message, updated_at, session_id),
+            )
+        return cur.rowcount > 0
+
+    def delete(self, session_id: str) -> Optional[Dict]:
+        """Remove a session and return it (None if it did not exist)."""
+        session = self.get(session_id)
+        if session:
+            with self._conn() as conn:
+                conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        return session
+
+
+session_store = SessionStore()
@@ -18,22 +18,40 @@ st.set_page_config(page_title="راینا", page_icon="🤖", layout="wide")
 API_URL = os.environ.get("FASTAPI_URL", "http://fastapi:80") + "/api/chat"
 
 # -------------------------------------------------------------------
-# Wait for FastAPI to be ready
-# -------------------------------------------------------------------
-MAX_RETRIES = 10
-RETRY_DELAY = 2  # seconds
-
-for attempt in range(MAX_RETRIES):
-    try:
-        resp = requests.get(API_URL.replace("/api/chat", "/"), timeout=5)
-        if resp.status_code == 200:
-            logger.info("FastAPI is ready!")
-            break
-    except requests.exceptions.RequestException:
+# Keep-alive HTTP session, shared by every rerun and user of this process
+# (a plain module-level object would be rebuilt on each Streamlit rerun)
+# -------------------------------------------------------------------
+@st.cache_resource(show_spinner=False)
+def get_http_session() -> requests.Session:
+    session = requests.Session()
+    session.headers.update({"Content-Type": "application/json"})
+    return session
+
+
+# -------------------------------------------------------------------
+# Wait for FastAPI to be ready (once per Streamlit process, not per rerun)
+# -------------------------------------------------------------------
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 0.25  # seconds, doubled after each failed probe (~8s worst case)
+
+
+@st.cache_resource(show_spinner=False)
+def wait_for_backend() -> bool:
+    for attempt in range(MAX_RETRIES):
+        try:
+            resp = get_http_session().get(API_URL.replace("/api/chat", "/"), timeout=1.0)
+            if resp.status_code == 200:
+                logger.info("FastAPI is ready!")
+                return True
+        except requests.exceptions.RequestException:
+            pass
         logger.info(f"FastAPI not ready, retrying ({attempt + 1}/{MAX_RETRIES})...")
-        time.sleep(RETRY_DELAY)
-else:
+        time.sleep(RETRY_BASE_DELAY * 2 ** attempt)
     logger.warning("FastAPI did not respond after multiple retries. Requests may fail.")
+    return False
+
+
+wait_for_backend()
 
 # -------------------------------------------------------------------
 # Generate a random USER_ID only once per Streamlit session
@@ -72,19 +90,25 @@ st.title("راینا دستیار هوشمند آیین‌نامه‌های دا
 # -------------------------------------------------------------------
 # API Call Wrapper
 # -------------------------------------------------------------------
-def get_chat_response(user_id: str, message: str, session_id: str | None):
-    """Send message to backend API via POST and get assistant response."""
+def stream_chat_response(user_id: str, message: str, session_id: str | None):
+    """Open the backend SSE stream; returns (token generator, session_id)."""
     payload = {"user_id": user_id, "message": message, "session_id": session_id}
-    headers = {"Content-Type": "application/json"}
 
-    try:
-        res = requests.post(API_URL, json=payload, headers=headers, timeout=60)
-        res.raise_for_status()
-        data = res.json()
-        return data.get("reply", "پاسخی دریافت نشد."), data.get("session_id")
-    except Exception as exc:
-        logger.error(f"Error connecting to API: {exc}")
-        return f"⚠️ خطا در ارتباط با سرور: {exc}", session_id
+    res = get_http_session().post(API_URL + "/stream", json=payload, stream=True, timeout=60)
+    res.raise_for_status()
+
+    def tokens():
+        with res:
+            for raw in res.iter_lines():
+                line = raw.decode("utf-8")
+                if not line.startswith("data: "):
+                    continue
+                data = line[len("data: "):]
+                if data == "[DONE]":
+                    break
+                yield json.loads(data).get("token", "")
+
+    return tokens(), res.headers.get("X-Session-Id", session_id)
 
 # -------------------------------------------------------------------
 # Session State Init
@@ -94,43 +118,57 @@ st.session_state.setdefault("session_id", None)
 st.session_state.setdefault("intro_shown", False)
 
 # -------------------------------------------------------------------
-# Intro Animation (Shown Only Once)
-# -------------------------------------------------------------------
-if not st.session_state.intro_shown and len(st.session_state.messages) == 0:
-    st.markdown("""
-    <div class="intro-container">
-        <img src="https://i.gifer.com/XDZT.gif" alt="AI Animation">
-        <div class="typing">👋 سلام... من راینا هستم — دستیار هوشمند شما 💫</div>
-    </div>
-    """, unsafe_allow_html=True)
-    st.session_state.intro_shown = True
-
-# -------------------------------------------------------------------
-# Display Chat Messages
-# -------------------------------------------------------------------
-for msg in st.session_state.messages:
-    with st.chat_message(msg["role"]):
-        st.markdown(msg["content"])
-
-# -------------------------------------------------------------------
-# User Input Handling
-# -------------------------------------------------------------------
-if prompt := st.chat_input("پیام خود را بنویسید..."):
-    st.session_state.messages.append({"role": "user", "content": prompt})
-
-    with st.chat_message("user"):
-        st.markdown(prompt)
-
-    with st.chat_message("assistant"):
-        with st.spinner("در حال پردازش..."):
-            reply, new_session = get_chat_response(
-                st.session_state.user_id,
-                prompt,
-                st.session_state.session_id
-            )
-        st.markdown(reply)
-
-    st.session_state.messages.append({"role": "assistant", "content": reply})
-
-    if new_session:
-        st.session_state.session_id = new_session
+# Chat view: a fragment, so sending a message reruns only this part
+# (not the page CSS, title and startup probe above)
+# -------------------------------------------------------------------
+@st.fragment
+def chat_view():
+    # -------------------------------------------------------------------
+    # Intro Animation (Shown Only Once)
+    # -------------------------------------------------------------------
+    if not st.session_state.intro_shown and len(st.session_state.messages) == 0:
+        st.markdown("""
+        <div class="intro-container">
+            <img src="https://i.gifer.com/XDZT.gif" alt="AI Animation">
+            <div class="typing">👋 سلام... من راینا هستم — دستیار هوشمند شما 💫</div>
+        </div>
+        """, unsafe_allow_html=True)
+        st.session_state.intro_shown = True
+
+    # -------------------------------------------------------------------
+    # Display Chat Messages
+    # -------------------------------------------------------------------
+    for msg in st.session_state.messages:
+        with st.chat_message(msg["role"]):
+            st.markdown(msg["content"])
+
+    # -------------------------------------------------------------------
+    # User Input Handling
+    # -------------------------------------------------------------------
+    if prompt := st.chat_input("پیام خود را بنویسید..."):
+        st.session_state.messages.append({"role": "user", "content": prompt})
+
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        with st.chat_message("assistant"):
+            try:
+                with st.spinner("در حال پردازش..."):
+                    tokens, new_session = stream_chat_response(
+                        st.session_state.user_id,
+                        prompt,
+                        st.session_state.session_id
+                    )
+                reply = st.write_stream(tokens) or "پاسخی دریافت نشد."
+            except Exception as exc:
+                logger.error(f"Error connecting to API: {exc}")
+                reply, new_session = f"⚠️ خطا در ارتباط با سرور: {exc}", st.session_state.session_id
+                st.markdown(reply)
+
+        st.session_state.messages.append({"role": "assistant", "content": reply})
+
+        if new_session:
+            st.session_state.session_id = new_session
+
+
+chat_view()
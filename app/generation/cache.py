@@ -0,0 +1,97 @@
+"""
+generation/cache.py
+
+Answer caches for RAGAssistant:
+  - SQLiteCache: exact-match LLM responses keyed by a prompt hash, persisted on disk.
+  - SemanticCache: in-memory answers keyed by question embedding, matched by cosine similarity.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+
+def prompt_key(*parts: str) -> str:
+    """Stable cache key for an LLM call (prompt, system prompt, model, ...)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")  # separator, so ("ab", "c") and ("a", "bc") differ
+    return h.hexdigest()
+
+
+class SQLiteCache:
+    """Key/value cache in a SQLite file (WAL); one connection per thread."""
+
+    def __init__(self, path: str = ".llm_cache.db"):
+        self.path = path
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        row = self._conn().execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str) -> None:
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created_at) VALUES (?, ?, ?)",
+                (key, value, time.time()),
+            )
+
+
+class SemanticCache:
+    """
+    Ring buffer of unit-norm question embeddings and their answers.
+    A lookup is one matrix-vector product; a hit needs cosine similarity above threshold.
+    Vectors are float32: numpy has no BLAS path for float16 matmul, which runs ~30x slower.
+    """
+
+    def __init__(self, threshold: float = 0.95, capacity: int = 1024):
+        self.threshold = threshold
+        self.capacity = capacity
+        self._vecs: Optional[np.ndarray] = None  # allocated on first add, once the dimension is known
+        self._answers: List[Optional[str]] = [None] * capacity
+        self._size = 0
+        self._pos = 0
+        self._lock = threading.Lock()
+
+    def _unit(self, vec) -> np.ndarray:
+        q = np.asarray(vec, dtype=np.float32)
+        return q / (np.linalg.norm(q) or 1.0)
+
+    def get(self, embedding) -> Optional[str]:
+        q = self._unit(embedding)
+        with self._lock:
+            if not self._size or self._vecs.shape[1] != q.shape[0]:
+                return None
+            sims = self._vecs[:self._size] @ q
+            i = int(sims.argmax())
+            return self._answers[i] if sims[i] > self.threshold else None
+
+    def add(self, embedding, answer: str) -> None:
+        q = self._unit(embedding)
+        with self._lock:
+            if self._vecs is None or self._vecs.shape[1] != q.shape[0]:
+                self._vecs = np.empty((self.capacity, q.shape[0]), dtype=np.float32)
+                self._size = self._pos = 0
+            self._vecs[self._pos] = q
+            self._answers[self._pos] = answer
+            self._pos = (self._pos + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
@@ -1,13 +1,17 @@
+import asyncio
 import logging
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from types import MappingProxyType
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Optional, List, Dict, Any
 
 from app.agents.llm_local import LocalLLM
-from app.agents.llm_memory import MemoryAgent
+from app.agents.llm_memory import get_memory_agent
 from app.utils.utils import load_config, build_prompt
 from app.prompts.loader import load_prompt
 from app.retrieval.ContextAggregator import RAGPromptBuilder
 from app.agents.llm_api import LLM  # Optional API LLM
+from app.generation.cache import SQLiteCache, SemanticCache, prompt_key
 import requests  # to detect network errors
 
 # ----------------------------------------------------------------------
@@ -15,6 +19,14 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
 
+UNKNOWN_SOURCE = "منبع نامشخص"
+_EMPTY_METADATA = MappingProxyType({})  # shared, read-only metadata of sourceless contexts
+
+
+def _unknown_source(text: str) -> Dict[str, Any]:
+    return {"doc_id": UNKNOWN_SOURCE, "text": text, "full_text": text, "metadata": _EMPTY_METADATA}
+
+
 class RAGAssistant:
     """RAG Assistant with proper source titles instead of Doc IDs."""
 
@@ -37,7 +49,7 @@ class RAGAssistant:
         self.model_name_api = self.cfg["model"]["name_api"]
         self.model_name_local = self.cfg["model"]["name_local"]
 
-        self.memory_agent = MemoryAgent(persist_dir="chroma_memory")
+        self.memory_agent = get_memory_agent(persist_dir="chroma_memory")
 
         self.rag_builder = RAGPromptBuilder(
             chroma_collection_name=chroma_collection_name,
@@ -48,61 +60,44 @@ class RAGAssistant:
         self.system_prompt = load_prompt("system", "default")
         self.default_session_id = "default_session"
         self.default_user_id = None
+        # One LLM client for the assistant's lifetime, so its connection pool stays warm
+        self._llm = self._get_llm()
+
+        # Exact prompt -> answer (persistent) and question-embedding -> answer (in memory)
+        self._llm_cache = SQLiteCache(".llm_cache.db")
+        self._semantic_cache = SemanticCache(threshold=0.95)
+
+        # Memory/export/last-prompt writes run here after their answer was returned
+        self._io_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="rag-persist")
 
     def _normalize_retrieved(self, raw: Any, max_context: int) -> List[Dict[str, Any]]:
         """
         Normalize retrieved docs into list of dicts with real source titles or URLs.
         """
-        results: List[Dict[str, Any]] = []
-
         if isinstance(raw, str):
-            results.append({
-                "doc_id": "منبع نامشخص",
-                "text": raw,
-                "full_text": raw,
-                "metadata": {},
-            })
-            return results[:max_context]
-
-        if isinstance(raw, list):
-            for item in raw[:max_context]:
-                if isinstance(item, str):
-                    results.append({
-                        "doc_id": "منبع نامشخص",
-                        "text": item,
-                        "full_text": item,
-                        "metadata": {},
-                    })
-                    continue
-
-                if isinstance(item, dict):
-                    text = item.get("text") or item.get("full_text") or item.get("summary") or ""
-                    metadata = item.get("metadata", {})
-                    # Use title or URL as doc_id for proper reference
-                    doc_id = metadata.get("title") or metadata.get("source_name") or metadata.get("url_file") or text[:32]
-                    results.append({
-                        "doc_id": doc_id,
-                        "text": text,
-                        "full_text": item.get("full_text", text),
-                        "metadata": metadata,
-                    })
-                    continue
-
-                results.append({
-                    "doc_id": "منبع نامشخص",
-                    "text": str(item),
-                    "full_text": str(item),
-                    "metadata": {},
-                })
-            return results
+            return [_unknown_source(raw)]
+        if not isinstance(raw, list):
+            return [_unknown_source(str(raw))]
 
-        results.append({
-            "doc_id": "منبع نامشخص",
-            "text": str(raw),
-            "full_text": str(raw),
-            "metadata": {},
-        })
-        return results[:max_context]
+        results: List[Dict[str, Any]] = []
+        append = results.append
+        for item in raw[:max_context]:
+            if isinstance(item, dict):
+                get = item.get
+                text = get("text") or get("full_text") or get("summary") or ""
+                metadata = get("metadata") or _EMPTY_METADATA
+                # Use title or URL as doc_id for proper reference
+                md_get = metadata.get
+                doc_id = md_get("title") or md_get("source_name") or md_get("url_file") or text[:32]
+                append({
+                    "doc_id": doc_id,
+                    "text": text,
+                    "full_text": get("full_text", text),
+                    "metadata": metadata,
+                })
+            else:
+                append(_unknown_source(item if isinstance(item, str) else str(item)))
+        return results
 
     def retrieve_context(self, query: str, top_k: int = 3, max_context: int = 5) -> List[Dict[str, Any]]:
         try:
@@ -147,14 +142,44 @@ class RAGAssistant:
 
         return "\n".join(prompt_lines)
 
-    def generate_answer(self, user_question: str, session_id: Optional[str] = None, user_id: Optional[str] = None,
-                        top_k: int = 3, max_context: int = 5) -> str:
-        session_id = session_id or self.default_session_id
-        user_id = user_id or self.default_user_id
-
-        retrieved_docs = self.retrieve_context(user_question, top_k=top_k, max_context=max_context)
-        logger.info("Retrieved %d contexts.", len(retrieved_docs))
+    def _get_llm(self):
+        """Reuse one LLM client per assistant so its connection pool survives between requests."""
+        if getattr(self, "_llm", None) is None:
+            if self.use_local_llm:
+                self._llm = LocalLLM(model_name=self.model_name_local)
+            else:
+                self._llm = LLM(api_key=self.cfg["api"]["openai_key"], model=self.model_name_api)
+        return self._llm
 
+    async def awarmup(self) -> None:
+        """
+        Open Chroma/ES/embedding and LLM connections before the first request, so it
+        does not pay their cold start. Failures are logged; serving continues.
+        """
+        storage = self.rag_builder.storage
+        llm = self._get_llm()
+        llm_warmup = (
+            asyncio.to_thread(llm.warmup) if isinstance(llm, LocalLLM) else llm.awarmup()
+        )
+        results = await asyncio.gather(
+            asyncio.to_thread(storage.semantic_search, "ping", top_k=1),
+            asyncio.to_thread(storage.es_search, "ping", top_k=1),
+            llm_warmup,
+            return_exceptions=True,
+        )
+        for result in results:
+            if isinstance(result, Exception):
+                logger.warning("Warmup step failed: %s", result)
+
+    async def aclose(self) -> None:
+        """Finish pending memory writes and release the API client's connection pools (app shutdown)."""
+        await asyncio.to_thread(self._io_pool.shutdown, wait=True)
+        if isinstance(self._llm, LLM):
+            self._llm.close()
+            await self._llm.aclose()
+
+    def _prepare_prompt(self, user_question: str, retrieved_docs: List[Dict[str, Any]], max_context: int):
+        """Return (final_prompt, combined_system_prompt) for the LLM call."""
         memory_context = ""
         combined_system_prompt = f"{self.system_prompt}\n\n{memory_context}"
 
@@ -172,25 +197,66 @@ class RAGAssistant:
             final_prompt = self.build_model_prompt(aggregated_results, user_question, max_context=max_context)
 
         logger.debug("Final prompt length: %d", len(final_prompt))
+        return final_prompt, combined_system_prompt
 
+    def _question_embedding(self, user_question: str):
         try:
-            if self.use_local_llm:
-                llm = LocalLLM(model_name=self.model_name_local)
-                answer = llm.chat(final_prompt)
-            else:
-                api_llm = LLM(api_key=self.cfg["api"]["openai_key"], model=self.model_name_api)
-                answer = api_llm.generate_response(prompt=final_prompt, system=combined_system_prompt)
-        except requests.exceptions.RequestException as exc:
-            logger.exception("Network error when calling LLM: %s", exc)
-            raise
+            return self.memory_agent.embed(user_question)
         except Exception as exc:
-            logger.exception("LLM generation failed: %s", exc)
-            answer = "خطا در تولید پاسخ توسط مدل رخ داد."
+            logger.warning("Could not embed question for the answer cache: %s", exc)
+            return None
 
+    async def _aquestion_embedding(self, user_question: str):
+        try:
+            return await self.memory_agent.aembed(user_question)
+        except Exception as exc:
+            logger.warning("Could not embed question for the answer cache: %s", exc)
+            return None
+
+    def _semantic_hit(self, q_emb) -> Optional[str]:
+        answer = self._semantic_cache.get(q_emb) if q_emb is not None else None
+        if answer is not None:
+            logger.info("Semantic answer cache hit.")
+        return answer
+
+    def _llm_cache_key(self, final_prompt: str, combined_system_prompt: str) -> str:
+        model = self.model_name_local if self.use_local_llm else self.model_name_api
+        return prompt_key(final_prompt, combined_system_prompt, model)
+
+    def _cached_llm_answer(self, key: str) -> Optional[str]:
+        try:
+            answer = self._llm_cache.get(key)
+        except Exception as exc:
+            logger.warning("LLM cache read failed: %s", exc)
+            return None
+        if answer is not None:
+            logger.info("LLM response cache hit.")
+        return answer
+
+    def _remember_answer(self, key: str, q_emb, answer: str) -> None:
+        """Cache a successful answer under its exact prompt and its question embedding."""
+        if not answer:
+            # An empty reply (e.g. a stream with no content deltas, or a filtered answer) would
+            # otherwise be replayed for every similar question
+            return
+        try:
+            self._llm_cache.set(key, answer)
+        except Exception as exc:
+            logger.warning("LLM cache write failed: %s", exc)
+        if q_emb is not None:
+            self._semantic_cache.add(q_emb, answer)
+
+    def _finish_turn(self, user_question: str, answer: str, final_prompt: str,
+                     session_id: str, user_id: Optional[str], q_emb=None) -> None:
+        """
+        Store the turn in memory, export it and keep the last prompt for debugging.
+        q_emb (the question embedding computed for the turn) is reused by store_memory
+        when the summary is at most EMBEDDING_REUSE_MAX_CHARS, saving a second embedding call.
+        """
         try:
             summary_text = f"پرسش: {user_question}\nپاسخ: {answer}"
             store_user_id = user_id or session_id
-            self.memory_agent.store_memory(store_user_id, session_id, summary_text)
+            self.memory_agent.store_memory(store_user_id, session_id, summary_text, embedding=q_emb)
 
             json_path = Path("memory_exports") / f"{store_user_id}_{session_id}.json"
             json_path.parent.mkdir(parents=True, exist_ok=True)
@@ -200,13 +266,154 @@ class RAGAssistant:
         except Exception as exc:
             logger.warning("Could not update memory: %s", exc)
 
+        if not final_prompt:
+            return  # answered from cache, no prompt was built
         try:
             Path("last_prompt.txt").write_text(final_prompt, encoding="utf-8")
         except Exception:
             pass
 
+    def _finish_turn_later(self, *args) -> None:
+        """Run _finish_turn on the I/O pool so the answer returns before memory/disk writes."""
+        self._io_pool.submit(self._finish_turn, *args).add_done_callback(self._log_turn_failure)
+
+    @staticmethod
+    def _log_turn_failure(future: Future) -> None:
+        exc = future.exception()
+        if exc is not None:
+            logger.warning("Background turn persistence failed: %s", exc)
+
+    async def _aretrieve(self, user_question: str, top_k: int, max_context: int):
+        """
+        Start retrieval, and look the question up in the semantic cache while it runs.
+        Returns (q_emb, cached_answer, retrieved_docs); retrieved_docs is None on a hit.
+        """
+        retrieval = asyncio.create_task(asyncio.to_thread(
+            self.retrieve_context, user_question, top_k=top_k, max_context=max_context
+        ))
+        q_emb = await self._aquestion_embedding(user_question)
+        cached = self._semantic_hit(q_emb)
+        if cached is not None:
+            retrieval.cancel()  # the worker thread finishes on its own; its result is dropped
+            return q_emb, cached, None
+
+        retrieved_docs = await retrieval
+        logger.info("Retrieved %d contexts.", len(retrieved_docs))
+        return q_emb, None, retrieved_docs
+
+    def generate_answer(self, user_question: str, session_id: Optional[str] = None, user_id: Optional[str] = None,
+                        top_k: int = 3, max_context: int = 5) -> str:
+        session_id = session_id or self.default_session_id
+        user_id = user_id or self.default_user_id
+
+        q_emb = self._question_embedding(user_question)
+        cached = self._semantic_hit(q_emb)
+        if cached is not None:
+            self._finish_turn_later(user_question, cached, "", session_id, user_id, q_emb)
+            return cached
+
+        retrieved_docs = self.retrieve_context(user_question, top_k=top_k, max_context=max_context)
+        logger.info("Retrieved %d contexts.", len(retrieved_docs))
+
+        final_prompt, combined_system_prompt = self._prepare_prompt(user_question, retrieved_docs, max_context)
+
+        key = self._llm_cache_key(final_prompt, combined_system_prompt)
+        answer = self._cached_llm_answer(key)
+        if answer is None:
+            try:
+                llm = self._get_llm()
+                if self.use_local_llm:
+                    answer = llm.chat(final_prompt)
+                else:
+                    answer = llm.generate_response(prompt=final_prompt, system=combined_system_prompt)
+                self._remember_answer(key, q_emb, answer)
+            except requests.exceptions.RequestException as exc:
+                logger.exception("Network error when calling LLM: %s", exc)
+                raise
+            except Exception as exc:
+                logger.exception("LLM generation failed: %s", exc)
+                answer = "خطا در تولید پاسخ توسط مدل رخ داد."
+
+        self._finish_turn_later(user_question, answer, final_prompt, session_id, user_id, q_emb)
         return answer
 
+    async def generate_answer_async(self, user_question: str, session_id: Optional[str] = None,
+                                    user_id: Optional[str] = None, top_k: int = 3, max_context: int = 5) -> str:
+        """
+        Async generate_answer: the LLM call is awaited on the event loop instead of
+        holding a worker thread; blocking Chroma/ES work runs in short to_thread hops.
+        Retrieval overlaps the semantic-cache lookup, and the memory write runs after returning.
+        """
+        session_id = session_id or self.default_session_id
+        user_id = user_id or self.default_user_id
+
+        q_emb, cached, retrieved_docs = await self._aretrieve(user_question, top_k, max_context)
+        if cached is not None:
+            self._finish_turn_later(user_question, cached, "", session_id, user_id, q_emb)
+            return cached
+
+        final_prompt, combined_system_prompt = self._prepare_prompt(user_question, retrieved_docs, max_context)
+
+        key = self._llm_cache_key(final_prompt, combined_system_prompt)
+        answer = self._cached_llm_answer(key)
+        if answer is None:
+            try:
+                llm = self._get_llm()
+                if self.use_local_llm:
+                    answer = await llm.achat(final_prompt)
+                else:
+                    answer = await llm.agenerate_response(prompt=final_prompt, system=combined_system_prompt)
+                self._remember_answer(key, q_emb, answer)
+            except Exception as exc:
+                logger.exception("LLM generation failed: %s", exc)
+                answer = "خطا در تولید پاسخ توسط مدل رخ داد."
+
+        self._finish_turn_later(user_question, answer, final_prompt, session_id, user_id, q_emb)
+        return answer
+
+    async def stream_answer(self, user_question: str, session_id: Optional[str] = None,
+                            user_id: Optional[str] = None, top_k: int = 3, max_context: int = 5) -> AsyncIterator[str]:
+        """
+        Like generate_answer_async, but yields the answer text as the LLM produces it.
+        Memory is updated with the full answer in the background once the stream ends.
+        """
+        session_id = session_id or self.default_session_id
+        user_id = user_id or self.default_user_id
+
+        q_emb, cached, retrieved_docs = await self._aretrieve(user_question, top_k, max_context)
+        if cached is not None:
+            yield cached
+            self._finish_turn_later(user_question, cached, "", session_id, user_id, q_emb)
+            return
+
+        final_prompt, combined_system_prompt = self._prepare_prompt(user_question, retrieved_docs, max_context)
+
+        key = self._llm_cache_key(final_prompt, combined_system_prompt)
+        cached = self._cached_llm_answer(key)
+        pieces: List[str] = []
+        if cached is not None:
+            pieces.append(cached)
+            yield cached
+        else:
+            try:
+                llm = self._get_llm()
+                if self.use_local_llm:
+                    stream = llm.astream_chat(final_prompt)
+                else:
+                    stream = llm.astream_response(prompt=final_prompt, system=combined_system_prompt)
+                async for piece in stream:
+                    pieces.append(piece)
+                    yield piece
+                self._remember_answer(key, q_emb, "".join(pieces).strip())
+            except Exception as exc:
+                logger.exception("LLM generation failed: %s", exc)
+                if not pieces:
+                    pieces.append("خطا در تولید پاسخ توسط مدل رخ داد.")
+                    yield pieces[0]
+
+        answer = "".join(pieces).strip()
+        self._finish_turn_later(user_question, answer, final_prompt, session_id, user_id, q_emb)
+
 # Example usage (keep as needed)
 if __name__ == "__main__":
     BASE_DIR = Path(__file__).resolve().parent.parent
@@ -1,12 +1,19 @@
+import functools
+import hashlib
 import logging
+import os
+import socket
 import tempfile
+import threading
 import subprocess
+import time
 import shutil
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import List, Optional
 from PIL import Image
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, pdfinfo_from_path
 from app.utils.utils import load_config
 from app.agents.llm_image import OpenAIOCR
 
@@ -17,16 +24,29 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 # -------------------------
-# Load config
+# Load config (on first use, parsed once per process)
 # -------------------------
-try:
-    cfg = load_config("./app/config/config.yaml")
-except Exception as e:
-    logger.error("Error loading config: %s", e)
-    raise RuntimeError("Config loading failed") from e
+@functools.lru_cache(maxsize=1)
+def _cfg() -> dict:
+    try:
+        return load_config(os.environ.get("APP_CONFIG", "./app/config/config.yaml"))
+    except Exception as e:
+        logger.error("Error loading config: %s", e)
+        raise RuntimeError("Config loading failed") from e
 
-API_KEY = cfg["api"].get("openai_key")
-MODEL_NAME = cfg["model"]["name_api"]
+OCR_WORKERS = 8  # page OCR threads per PDF; API calls are further bounded by the OCR slots below
+# OCR API requests in flight across all extractor processes (worker pools share one semaphore)
+OCR_MAX_IN_FLIGHT = int(os.environ.get("OCR_MAX_IN_FLIGHT", "8"))
+OCR_PROMPT = "Extract and clean Persian text only:"
+OCR_CACHE_DIR = Path(".ocr_cache")  # sha256(image bytes, model, prompt) -> extracted text
+# Pages are rendered greyscale JPEG (text needs no colour; several times fewer upload bytes)
+PAGE_JPEG_OPTIONS = {"quality": 85, "optimize": "y", "progressive": "n"}
+OCR_RETRY_DPI = 250  # a page whose OCR comes back empty is rendered once more at this dpi
+
+# Long-lived LibreOffice for DOCX -> PDF (unoserver owns the soffice --accept process)
+UNO_HOST = "127.0.0.1"
+UNO_PORT = 2002         # soffice UNO socket
+UNOSERVER_PORT = 2003   # unoserver XML-RPC port used by unoconvert
 
 # -------------------------
 # Utility functions
@@ -39,9 +59,10 @@ def save_text(txt_path: Path, text: str) -> None:
 
 
 def init_ocr_client() -> OpenAIOCR:
+    cfg = _cfg()
     return OpenAIOCR(
-        api_key=API_KEY,
-        model=MODEL_NAME,
+        api_key=cfg["api"].get("openai_key"),
+        model=cfg["model"]["name_api"],
         system_prompt=(
             "You are an OCR assistant. Extract and clean Persian text "
             "from each image page with high accuracy and keep flowchart data readable."
@@ -50,6 +71,99 @@ def init_ocr_client() -> OpenAIOCR:
     )
 
 
+_ocr_slots = threading.BoundedSemaphore(OCR_MAX_IN_FLIGHT)  # replaced in pool workers by set_ocr_slots
+
+
+def set_ocr_slots(slots) -> None:
+    """Bound OCR API calls with a semaphore shared across processes (e.g. multiprocessing.BoundedSemaphore)."""
+    global _ocr_slots
+    _ocr_slots = slots
+
+
+_ocr_clients = {}  # pid -> OpenAIOCR, so each worker process builds exactly one client
+_ocr_clients_lock = threading.Lock()
+
+
+def get_ocr_client() -> OpenAIOCR:
+    """Shared OCR client of the current process, created on first use."""
+    pid = os.getpid()
+    client = _ocr_clients.get(pid)
+    if client is None:
+        with _ocr_clients_lock:
+            client = _ocr_clients.get(pid)
+            if client is None:
+                client = _ocr_clients[pid] = init_ocr_client()
+    return client
+
+
+def _cached_ocr(ocr_client, image_path) -> str:
+    """
+    OCR an image file, reusing the text of an earlier run on identical bytes
+    (re-ingested corpora, retries after failure, repeated headers/blank pages).
+    API errors propagate and are not cached.
+    """
+    h = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    h.update(f"\0{ocr_client.model}\0{OCR_PROMPT}".encode("utf-8"))
+    digest = h.hexdigest()
+    cache_path = OCR_CACHE_DIR / digest[:2] / digest
+
+    if cache_path.exists():
+        logger.info("OCR cache hit for %s", Path(image_path).name)
+        return cache_path.read_text(encoding="utf-8")
+
+    with Image.open(image_path) as img, _ocr_slots:  # cache hits above take no slot
+        text = ocr_client.ocr(img, user_prompt=OCR_PROMPT) or ""
+
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_name(f"{digest}.{os.getpid()}.tmp")
+    tmp_path.write_text(text, encoding="utf-8")
+    os.replace(tmp_path, cache_path)  # atomic, safe with concurrent worker processes
+    return text
+
+
+def _render_pages(pdf_path: Path, output_folder: str, dpi: int, **kwargs) -> List[str]:
+    """Render PDF pages to greyscale JPEG files with a single pdftoppm run; returns their paths."""
+    return convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        output_folder=output_folder,
+        paths_only=True,
+        fmt="jpeg",
+        jpegopt=PAGE_JPEG_OPTIONS,
+        grayscale=True,
+        thread_count=4,
+        **kwargs,
+    )
+
+
+def _ocr_page(ocr_client, page_path: str, page_idx: int, pdf_path: Optional[Path] = None) -> str:
+    """
+    OCR one rendered page file and delete it; failures log and yield ''.
+    With pdf_path given, an empty result is retried once from a OCR_RETRY_DPI render.
+    """
+    try:
+        text = _cached_ocr(ocr_client, page_path)
+        if text.strip() or pdf_path is None:
+            return text
+        logger.info("Empty OCR on page %d, retrying at %d dpi", page_idx, OCR_RETRY_DPI)
+        # Own directory per retry: pdf2image collects its output by filename prefix, so a shared
+        # folder would let page 1's retry pick up (and delete) retry files of pages 10-19
+        with tempfile.TemporaryDirectory(prefix=f"retry_{page_idx}_", dir=os.path.dirname(page_path)) as retry_dir:
+            for retry_path in _render_pages(
+                pdf_path, retry_dir, OCR_RETRY_DPI, first_page=page_idx, last_page=page_idx,
+            ):
+                text = _cached_ocr(ocr_client, retry_path)
+        return text
+    except Exception as e:
+        logger.warning("OCR failed on page %d: %s", page_idx, e)
+        return ""
+    finally:
+        os.unlink(page_path)  # free disk as pages complete
+
+
 def _make_safe_docx_copy(src: Path, temp_dir: Path) -> Path:
     """Copy src to a temp file with an ASCII-only, UUID-based name to avoid LibreOffice issues."""
     safe_name = f"doc_{uuid.uuid4().hex}.docx"
@@ -58,14 +172,108 @@ def _make_safe_docx_copy(src: Path, temp_dir: Path) -> Path:
     logger.info("Created safe copy for conversion: %s -> %s", src, safe_path)
     return safe_path
 
+# -------------------------
+# Long-lived LibreOffice (unoserver)
+# -------------------------
+def _port_open(host: str, port: int) -> bool:
+    try:
+        with socket.create_connection((host, port), timeout=0.5):
+            return True
+    except OSError:
+        return False
+
+
+class LibreOfficeDaemon:
+    """
+    One headless soffice kept alive by unoserver, so each DOCX conversion skips
+    LibreOffice startup. Conversions go through `unoconvert`; when the daemon is
+    not running, convert_docx_to_pdf_linux falls back to a one-shot libreoffice.
+    """
+
+    def __init__(self, host: str = UNO_HOST, port: int = UNOSERVER_PORT, uno_port: int = UNO_PORT):
+        self.host = host
+        self.port = port
+        self.uno_port = uno_port
+        self._proc: Optional[subprocess.Popen] = None
+
+    def start(self, timeout: float = 30) -> bool:
+        """Launch unoserver (no-op if one already listens); True once it accepts connections."""
+        if _port_open(self.host, self.port):
+            return True
+        cmd = [
+            "unoserver",
+            "--interface", self.host,
+            "--port", str(self.port),
+            "--uno-port", str(self.uno_port),
+        ]
+        try:
+            self._proc = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except FileNotFoundError:
+            logger.warning("unoserver not installed; DOCX conversion will start LibreOffice per file")
+            return False
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._proc.poll() is not None:
+                logger.warning("unoserver exited with code %s", self._proc.returncode)
+                self._proc = None
+                return False
+            if _port_open(self.host, self.port):
+                logger.info("LibreOffice daemon ready on %s:%d", self.host, self.port)
+                return True
+            time.sleep(0.25)
+        logger.warning("unoserver did not become ready within %.0fs", timeout)
+        self.stop()
+        return False
+
+    def stop(self) -> None:
+        if self._proc is None:
+            return
+        self._proc.terminate()
+        try:
+            self._proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+        self._proc = None
+        logger.info("LibreOffice daemon stopped")
+
+
+def _convert_with_unoserver(input_docx: Path, output_pdf: Path, timeout: Optional[int]) -> bool:
+    """Convert through a running unoserver; False if none is reachable or conversion fails."""
+    if not _port_open(UNO_HOST, UNOSERVER_PORT):
+        return False
+    cmd = [
+        "unoconvert",
+        "--host", UNO_HOST,
+        "--port", str(UNOSERVER_PORT),
+        "--convert-to", "pdf",
+        str(input_docx),
+        str(output_pdf),
+    ]
+    try:
+        proc = subprocess.run(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, timeout=timeout
+        )
+    except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+        logger.warning("unoconvert failed for %s: %s", input_docx.name, e)
+        return False
+    if proc.returncode != 0:
+        logger.warning("unoconvert failed for %s: %s", input_docx.name, proc.stderr.strip())
+        return False
+    return output_pdf.exists() and output_pdf.stat().st_size > 0
+
 # -------------------------
 # DOCX → PDF (Linux-safe)
 # -------------------------
 def convert_docx_to_pdf_linux(input_docx: Path, output_dir: Path, timeout: Optional[int] = 120) -> Path:
-    """Convert DOCX to PDF using LibreOffice headless."""
+    """Convert DOCX to PDF via the LibreOffice daemon, or a one-shot LibreOffice headless run."""
     output_dir.mkdir(parents=True, exist_ok=True)
     expected_pdf = output_dir / (input_docx.stem + ".pdf")
 
+    if _convert_with_unoserver(input_docx, expected_pdf, timeout):
+        logger.info("✔ DOCX converted to PDF via unoserver: %s", expected_pdf)
+        return expected_pdf
+
     cmd = [
         "libreoffice",
         "--headless",
@@ -97,53 +305,51 @@ def convert_docx_to_pdf_linux(input_docx: Path, output_dir: Path, timeout: Optio
     return expected_pdf
 
 # -------------------------
-# PDF OCR (page-by-page, low RAM)
+# PDF OCR (single render pass, OCR_WORKERS pages in flight)
 # -------------------------
 def process_pdf(pdf_path: Path, ocr_client=None, dpi: int = 150, max_pages: Optional[int] = None) -> str:
     logger.info("Processing PDF %s...", pdf_path)
 
     if ocr_client is None:
-        ocr_client = init_ocr_client()
+        ocr_client = get_ocr_client()
 
-    text_data = ""
     temp_dir = Path(tempfile.gettempdir())
     temp_pdf = temp_dir / ("pdf_temp_" + uuid.uuid4().hex + ".pdf")
     try:
         shutil.copy(pdf_path, temp_pdf)
         logger.info("Copied PDF to temp file %s", temp_pdf)
 
-        # Determine total pages
         try:
-            total_pages = convert_from_path(temp_pdf, dpi=72, first_page=1, last_page=1)
-            total_pages_count = len(total_pages)
-        except Exception:
-            total_pages_count = None  # fallback to None to process with pdf2image default
+            total_pages_count = pdfinfo_from_path(temp_pdf)["Pages"]
+        except Exception as e:
+            logger.warning("Could not read page count of %s: %s", pdf_path.name, e)
+            total_pages_count = None
         if max_pages and total_pages_count:
             total_pages_count = min(total_pages_count, max_pages)
+        logger.info("Rendering %s pages of %s", total_pages_count or "all", pdf_path.name)
 
-        # Page-by-page conversion
-        page_idx = 1
-        while True:
-            if total_pages_count and page_idx > total_pages_count:
-                break
+        # One pdftoppm run renders every page to greyscale JPEG files on disk (the PDF is parsed once);
+        # pages are then OCRed concurrently and reassembled by index.
+        with tempfile.TemporaryDirectory(prefix="pdf_pages_") as pages_dir:
             try:
-                images = convert_from_path(temp_pdf, dpi=dpi, first_page=page_idx, last_page=page_idx)
+                page_paths = _render_pages(temp_pdf, pages_dir, dpi, last_page=total_pages_count)
             except Exception as e:
-                logger.warning("Failed to convert PDF page %d: %s", page_idx, e)
-                break
-            if not images:
-                break
+                logger.warning("Failed to convert PDF %s: %s", pdf_path.name, e)
+                page_paths = []
 
-            img = images[0]
-            try:
-                page_text = ocr_client.ocr(img, user_prompt="Extract and clean Persian text only:")
-                if page_text:
-                    text_data += f"\n\n--- Page {page_idx} ---\n{page_text.strip()}"
-            except Exception as e:
-                logger.warning("OCR failed on page %d: %s", page_idx, e)
-            finally:
-                img.close()  # free memory
-            page_idx += 1
+            with ThreadPoolExecutor(max_workers=min(OCR_WORKERS, OCR_MAX_IN_FLIGHT)) as pool:
+                page_futures = [
+                    (page_idx, pool.submit(_ocr_page, ocr_client, page_path, page_idx, temp_pdf))
+                    for page_idx, page_path in enumerate(page_paths, 1)
+                ]
+
+        # Reassemble in page order (one join instead of growing the string per page)
+        parts = []
+        for idx, future in page_futures:
+            page_text = future.result()
+            if page_text:
+                parts.append(f"\n\n--- Page {idx} ---\n{page_text.strip()}")
+        text_data = "".join(parts)
 
         save_text(pdf_path.with_suffix(".txt"), text_data)
         return text_data
@@ -157,14 +363,13 @@ def process_pdf(pdf_path: Path, ocr_client=None, dpi: int = 150, max_pages: Opti
 # -------------------------
 def process_image(image_path: Path, ocr_client=None) -> str:
     logger.info("Processing image: %s", image_path)
-    img = Image.open(image_path)
 
     if ocr_client is None:
-        ocr_client = init_ocr_client()
+        ocr_client = get_ocr_client()
 
     text_data = ""
     try:
-        text = ocr_client.ocr(img, user_prompt="Extract and clean Persian text only:")
+        text = _cached_ocr(ocr_client, image_path)
         if text:
             text_data += text + "\n"
     except Exception as e:
@@ -180,7 +385,7 @@ def process_docx(docx_path: Path, ocr_client=None, dpi: int = 150, max_pages: Op
     logger.info("Processing DOCX: %s", docx_path)
 
     if ocr_client is None:
-        ocr_client = init_ocr_client()
+        ocr_client = get_ocr_client()
 
     temp_dir = Path(tempfile.gettempdir())
     temp_dir.mkdir(parents=True, exist_ok=True)
@@ -201,7 +406,7 @@ def process_docx(docx_path: Path, ocr_client=None, dpi: int = 150, max_pages: Op
 # -------------------------
 # Video placeholder
 # -------------------------
-def process_video(video_path: Path) -> str:
+def process_video(video_path: Path, ocr_client=None) -> str:
     text_data = video_path.name
     save_text(video_path.with_suffix(".txt"), text_data)
     return text_data
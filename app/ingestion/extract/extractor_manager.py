@@ -1,5 +1,8 @@
 # extractor_manager.py
 import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Optional
 from .extractind_data  import *
@@ -7,33 +10,107 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 
+# Suffix -> extractor; every extractor takes (path, ocr_client)
+DISPATCH = {
+    ".pdf": process_pdf,
+    ".jpg": process_image,
+    ".jpeg": process_image,
+    ".png": process_image,
+    ".docx": process_docx,
+    ".mp4": process_video,
+}
+SOURCE_SUBDIRS = ("pdf", "docx", "jpg", "mp4")
+
+
+def _init_worker(ocr_slots) -> None:
+    """
+    Pool initializer: install the pool-wide OCR semaphore and preload the OCR client
+    (a preload failure surfaces per file instead).
+    """
+    set_ocr_slots(ocr_slots)
+    try:
+        get_ocr_client()
+    except Exception as e:
+        logger.warning("OCR client preload failed in worker %d: %s", os.getpid(), e)
+
+
 class DownloadFolderProcessor:
     """
     Process all files in the downloads directory (PDF, DOCX, JPG, MP4)
     and save all extracted text into a 'txt' subfolder.
+    Files are processed in parallel worker processes (max_workers, default: CPU count);
+    at most ocr_max_in_flight OCR requests run at once across all of them
+    (default: OCR_MAX_IN_FLIGHT, env OCR_MAX_IN_FLIGHT).
     """
 
-    def __init__(self, download_dir: str):
+    def __init__(self, download_dir: str, max_workers: Optional[int] = None,
+                 ocr_max_in_flight: Optional[int] = None):
         self.download_dir = Path(download_dir)
         self.txt_dir = self.download_dir / "txt"
-        self.ocr_client = init_ocr_client()
+        self.max_workers = max_workers or os.cpu_count()
+        self.ocr_max_in_flight = ocr_max_in_flight or OCR_MAX_IN_FLIGHT
+
+        # One LibreOffice for all DOCX conversions, shared by the worker processes
+        self._office = LibreOfficeDaemon()
+        self._office.start()
 
         # Create output directory
         self.txt_dir.mkdir(parents=True, exist_ok=True)
         logger.info("Initialized processor for %s", self.download_dir)
 
-    def process_all(self):
-        """Process all files inside known subdirectories."""
-        for subdir in ["pdf", "docx", "jpg", "mp4"]:
+    def __getstate__(self):
+        # The daemon handle stays in the parent; workers reach it over its socket
+        state = self.__dict__.copy()
+        state.pop("_office", None)
+        return state
+
+    def __del__(self):
+        office = self.__dict__.get("_office")
+        if office is not None:
+            office.stop()
+
+    @property
+    def ocr_client(self):
+        # Resolved per process, so the processor itself stays picklable for the pool
+        return get_ocr_client()
+
+    def _discover(self) -> list:
+        """One scandir pass per known subdirectory; keeps only files with a known extractor."""
+        file_paths = []
+        for subdir in SOURCE_SUBDIRS:
             folder = self.download_dir / subdir
-            if not folder.exists():
+            try:
+                entries = list(os.scandir(folder))
+            except FileNotFoundError:
                 logger.warning("Folder %s does not exist, skipping.", folder)
                 continue
 
             logger.info("Processing folder: %s", folder)
-            for file_path in folder.glob("*.*"):
+            for entry in entries:
+                if not entry.is_file():
+                    continue
+                file_path = Path(entry.path)
+                if file_path.suffix.lower() in DISPATCH:
+                    file_paths.append(file_path)
+                else:
+                    logger.warning("Unsupported file type: %s", file_path.suffix.lower())
+        return file_paths
+
+    def process_all(self):
+        """Process all files inside known subdirectories."""
+        file_paths = self._discover()
+
+        # One semaphore for the whole pool, so the OCR API sees ocr_max_in_flight requests at most,
+        # not max_workers x OCR_WORKERS; each worker also builds its OCR client once at start
+        ctx = multiprocessing.get_context()
+        ocr_slots = ctx.BoundedSemaphore(self.ocr_max_in_flight)
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers, mp_context=ctx, initializer=_init_worker, initargs=(ocr_slots,)
+        ) as pool:
+            futures = {pool.submit(self.process_file, file_path): file_path for file_path in file_paths}
+            for future, file_path in futures.items():
                 try:
-                    text = self.process_file(file_path)
+                    text = future.result()
                     if text:
                         out_path = self.txt_dir / f"{file_path.stem}.txt"
                         with open(out_path, "w", encoding="utf-8") as f:
@@ -44,18 +121,11 @@ class DownloadFolderProcessor:
 
     def process_file(self, file_path: Path) -> Optional[str]:
         """Detect file type and route to proper processing method."""
-        suffix = file_path.suffix.lower()
-        if suffix == ".pdf":
-            return process_pdf(file_path, self.ocr_client)
-        elif suffix == ".jpg" or suffix == ".jpeg" or suffix == ".png":
-            return process_image(file_path, self.ocr_client)
-        elif suffix == ".docx":
-            return process_docx(file_path, self.ocr_client)
-        elif suffix == ".mp4":
-            return process_video(file_path)
-        else:
-            logger.warning("Unsupported file type: %s", suffix)
+        extractor = DISPATCH.get(file_path.suffix.lower())
+        if extractor is None:
+            logger.warning("Unsupported file type: %s", file_path.suffix.lower())
             return None
+        return extractor(file_path, self.ocr_client)
 
 
 if __name__ == "__main__":
@@ -1,16 +1,26 @@
+import functools
 import json
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional
 
 
 from ollama import Client as OllamaClient
 from elasticsearch import Elasticsearch
+from elasticsearch.helpers import bulk
 
 __import__('pysqlite3')
 import sys
 sys.modules['sqlite3'] = sys.modules.pop('pysqlite3')
 import chromadb
 from chromadb.config import Settings
+
+EMBED_WORKERS = 16  # concurrent Ollama embedding requests
+STORE_BATCH = 256   # chunks embedded together and written in one collection.add / ES bulk
+QUERY_EMBED_CACHE = 1024  # query strings whose embeddings are memoized per storage
+
+
 class RAGStorage:
     """
     Stores summaries in ChromaDB (semantic search) and optionally full texts in Elasticsearch.
@@ -28,6 +38,9 @@ class RAGStorage:
         # --- Ollama client ---
         self.ollama = OllamaClient(host="http://ollama:11434")
         self.model_name = ollama_model
+        self._embed_pool = ThreadPoolExecutor(max_workers=EMBED_WORKERS)
+        # fallback retrieval re-embeds the same query for Chroma and the query history
+        self._embed_query = functools.lru_cache(maxsize=QUERY_EMBED_CACHE)(self._fetch_query_embedding)
 
         # --- ChromaDB HTTP Client ---
         self.chroma_client = chromadb.HttpClient(
@@ -61,65 +74,73 @@ class RAGStorage:
                 flat[k] = v
         return flat
 
-    def store(self, data: List[Dict[str, Any]]):
+    def store(self, data: Iterable[Dict[str, Any]]):
         """
         Store summaries in ChromaDB and optionally full texts in Elasticsearch.
         Skip already stored chunk_ids to avoid duplicates.
         Generates a report after storing.
+        `data` is consumed lazily, so a streaming iterator keeps memory flat.
         """
         skipped = 0
         errors = 0
         stored = 0
 
-        # Fetch existing IDs from ChromaDB to avoid duplicates
-        try:
-            existing_data = self.collection.get()
-            existing_ids = set(existing_data["ids"]) if existing_data else set()
-        except Exception:
-            existing_ids = set()
-
-        for item in data:
-            chunk_id = f"{item['doc_id']}_{item['chunk_id']}"
-            summary = item["metadata"].get("summary", "")
-            full_text = item.get("chunk_text", "")
-            metadata = self.flatten_metadata(item["metadata"])
-
-            if chunk_id in existing_ids:
-                skipped += 1
+        it = iter(data)
+        while True:
+            batch = list(islice(it, STORE_BATCH))
+            if not batch:
+                break
+
+            # Ask ChromaDB only about this slice's ids instead of listing the whole collection;
+            # earlier slices are already added, so repeats across slices are caught here too
+            candidate_ids = [f"{item['doc_id']}_{item['chunk_id']}" for item in batch]
+            existing_ids = set(self.collection.get(ids=candidate_ids, include=[])["ids"])
+
+            fresh = []
+            for chunk_id, item in zip(candidate_ids, batch):
+                if chunk_id in existing_ids:
+                    skipped += 1
+                    continue
+                existing_ids.add(chunk_id)  # also drops repeats inside the slice itself
+                fresh.append((chunk_id, item))
+            if not fresh:
                 continue
 
-            try:
-                # --- Compute embedding via Ollama ---
-                response = self.ollama.embeddings(model=self.model_name, prompt=summary)
-                embedding = response["embedding"]
+            # --- Compute embeddings via Ollama, the whole slice in parallel ---
+            embeddings = self._embed_many([item["metadata"].get("summary", "") for _, item in fresh])
 
-                # --- Store in ChromaDB ---
+            rows = []
+            for (chunk_id, item), embedding in zip(fresh, embeddings):
+                if embedding is None:
+                    errors += 1
+                    continue
+                rows.append((chunk_id, item, self.flatten_metadata(item["metadata"]), embedding))
+            if not rows:
+                continue
+
+            try:
+                # --- Store the slice in ChromaDB with one call ---
                 self.collection.add(
-                    ids=[chunk_id],
-                    embeddings=[embedding],
-                    documents=[summary],
-                    metadatas=[metadata],
+                    ids=[chunk_id for chunk_id, _, _, _ in rows],
+                    embeddings=[embedding for _, _, _, embedding in rows],
+                    documents=[item["metadata"].get("summary", "") for _, item, _, _ in rows],
+                    metadatas=[metadata for _, _, metadata, _ in rows],
                 )
-
-                # --- Store full text in Elasticsearch (if enabled) ---
-                if self.es:
-                    if not self.es.exists(index=self.es_index, id=chunk_id):
-                        self.es.index(
-                            index=self.es_index,
-                            id=chunk_id,
-                            document={
-                                "doc_id": item["doc_id"],
-                                "chunk_id": item["chunk_id"],
-                                "full_text": full_text,
-                                "metadata": metadata,
-                            },
-                        )
-
-                stored += 1
-
             except Exception as e:
-                print(f"Error storing chunk_id {chunk_id}: {e}")
-                errors += 1
+                print(f"Error storing batch of {len(rows)} chunks: {e}")
+                errors += len(rows)
+                continue
+
+            # --- Store full texts in Elasticsearch (if enabled): one mget + one bulk per slice ---
+            failed = 0
+            if self.es:
+                try:
+                    failed = self._es_store_batch(rows)
+                except Exception as e:
+                    print(f"Error storing batch of {len(rows)} chunks in Elasticsearch: {e}")
+                    failed = len(rows)
+            errors += failed
+            stored += len(rows) - failed
 
         # --- Report ---
         print("\n=== Storage Report ===")
@@ -139,39 +160,98 @@ class RAGStorage:
 
         print("======================\n")
 
+    def _es_store_batch(self, rows) -> int:
+        """Index the rows not yet in Elasticsearch; returns how many failed."""
+        ids = [chunk_id for chunk_id, _, _, _ in rows]
+        found = self.es.mget(index=self.es_index, ids=ids, source=False)
+        existing = {d["_id"] for d in found["docs"] if d.get("found")}
+
+        actions = (
+            {
+                "_op_type": "index",
+                "_index": self.es_index,
+                "_id": chunk_id,
+                "_source": {
+                    "doc_id": item["doc_id"],
+                    "chunk_id": item["chunk_id"],
+                    "full_text": item.get("chunk_text", ""),
+                    "metadata": metadata,
+                },
+            }
+            for chunk_id, item, metadata, _ in rows
+            if chunk_id not in existing
+        )
+        _, bulk_errors = bulk(self.es, actions, raise_on_error=False)
+        for err in bulk_errors:
+            print(f"Error storing chunk in Elasticsearch: {err}")
+        return len(bulk_errors)
+
+    def _embed_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Embed texts concurrently, preserving order; failed items come back as None."""
+        def embed(text: str) -> Optional[List[float]]:
+            try:
+                return self.ollama.embeddings(model=self.model_name, prompt=text)["embedding"]
+            except Exception as e:
+                print(f"Error computing embedding: {e}")
+                return None
+
+        return list(self._embed_pool.map(embed, texts))
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed query strings concurrently, preserving order; errors propagate.
+        Vectors are memoized per string (shared lists: do not mutate).
+        Same /api/embeddings endpoint as store(), so queries stay in the stored vector space
+        (/api/embed batches but returns L2-normalized vectors, which would skew L2 distances).
+        """
+        if len(texts) == 1:
+            return [self._embed_query(texts[0])]
+        return list(self._embed_pool.map(self._embed_query, texts))
+
+    def _fetch_query_embedding(self, text: str) -> List[float]:
+        return self.ollama.embeddings(model=self.model_name, prompt=text)["embedding"]
+
     def semantic_search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Perform semantic search on ChromaDB and optionally attach full text."""
-        response = self.ollama.embeddings(model=self.model_name, prompt=query)
-        query_embedding = response["embedding"]
+        return self.semantic_search_batch([query], top_k=top_k)[0]
 
+    def semantic_search_batch(self, queries: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """semantic_search for several queries: one embedding round, one Chroma query, one ES mget."""
+        if not queries:
+            return []
         results = self.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=self.embed_queries(queries),
             n_results=top_k,
         )
 
-        retrieved_docs = []
-        ids = results["ids"][0]
-        docs = results["documents"][0]
-        metas = results["metadatas"][0]
-
-        for i, doc_id in enumerate(ids):
-            entry = {
-                "doc_id": doc_id,
-                "summary": docs[i],
-                "metadata": metas[i],
-            }
-            if self.es:
-                try:
-                    es_doc = self.es.get(index=self.es_index, id=doc_id)
-                    entry["full_text"] = es_doc["_source"].get("full_text", "")
-                except Exception:
-                    entry["full_text"] = ""
-            else:
-                entry["full_text"] = ""
-
-            retrieved_docs.append(entry)
-
-        return retrieved_docs
+        full_by_id = self._es_full_texts(list(dict.fromkeys(i for ids in results["ids"] for i in ids)))
+        retrieved = []
+        for ids, docs, metas in zip(results["ids"], results["documents"], results["metadatas"]):
+            retrieved.append([
+                {
+                    "doc_id": doc_id,
+                    "summary": docs[i],
+                    "metadata": metas[i],
+                    "full_text": full_by_id.get(doc_id, ""),
+                }
+                for i, doc_id in enumerate(ids)
+            ])
+        return retrieved
+
+    def _es_full_texts(self, ids: List[str]) -> Dict[str, str]:
+        """full_text of each found id, fetched in one mget round-trip (empty if ES is off or fails)."""
+        if not self.es or not ids:
+            return {}
+        try:
+            found = self.es.mget(index=self.es_index, ids=ids, source_includes=["full_text"])
+        except Exception as e:
+            print(f"Error fetching full texts from Elasticsearch: {e}")
+            return {}
+        return {
+            d["_id"]: d["_source"].get("full_text", "")
+            for d in found["docs"]
+            if d.get("found")
+        }
 
     def es_search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """Search full texts in Elasticsearch (if enabled)."""
@@ -1,51 +1,138 @@
-import json
+import asyncio
 import logging
+import os
 import re
 from pathlib import Path
-from tqdm import tqdm
-from typing import List, Dict, Any
+import orjson
+from tqdm.asyncio import tqdm_asyncio
+from typing import List, Dict, Any, Iterable, Optional, Union
 from app.agents.llm_api import LLM
 from app.utils.utils import load_config
+from app.generation.cache import SQLiteCache, prompt_key
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_JSON_FENCE = re.compile(r"```json\s*(.*?)\s*```", re.DOTALL)
+PARSE_FAILED = "JSON parse failed"
+TRANSFORM_TEMPERATURE = 0.3
+TRANSFORM_MAX_TOKENS = 2048  # output budget per text chunk; a batched call gets this times its chunk count
+CHUNKS_PER_CALL = 4          # text chunks of one document sent together in one LLM call
+MODEL_MAX_OUTPUT_TOKENS = 4096  # completion limit assumed when config has no model.max_output_tokens_api
+
+
+class UnexpectedShape(ValueError):
+    """LLM answer parsed, but not into the JSON structure the prompt asked for."""
+
+
+class Chunk:
+    """
+    One output record; kept flat while processing, nested only when written out.
+    Slots declared by hand (dataclass(slots=True) needs Python 3.10).
+    """
+    __slots__ = ("doc_id", "chunk_id", "chunk_text", "title", "url_file", "page_range", "summary", "topics", "error")
+
+    def __init__(
+        self,
+        doc_id: str,
+        chunk_id: int,
+        chunk_text: str = "",
+        title: str = "",
+        url_file: str = "",
+        page_range: Any = None,
+        summary: Optional[str] = "",
+        topics: Optional[list] = None,
+        error: Optional[str] = None,
+    ):
+        self.doc_id = doc_id
+        self.chunk_id = chunk_id
+        self.chunk_text = chunk_text
+        self.title = title
+        self.url_file = url_file
+        self.page_range = page_range
+        self.summary = summary
+        self.topics = [] if topics is None else topics
+        self.error = error
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.error is not None:
+            return {
+                "doc_id": self.doc_id,
+                "chunk_id": self.chunk_id,
+                "chunk_text": "",
+                "metadata": {"title": self.title, "url_file": "", "page_range": None, "summary": None},
+                "error": self.error,
+            }
+        return {
+            "doc_id": self.doc_id,
+            "chunk_id": self.chunk_id,
+            "chunk_text": self.chunk_text,
+            "metadata": {
+                "title": self.title,
+                "url_file": self.url_file,
+                "page_range": self.page_range,
+                "summary": self.summary,
+                "topics": self.topics,
+            },
+        }
+
+
+def _is_chunk_list(items) -> bool:
+    return isinstance(items, list) and all(isinstance(item, dict) for item in items)
+
+
+def _passes_sanity_check(item) -> bool:
+    """
+    Whether one LLM chunk item yields a chunk that sanity_check._check_chunk accepts
+    (no error, non-empty string chunk_text, topics a list or absent).
+    """
+    if not isinstance(item, dict) or item.get("error"):
+        return False
+    chunk_text = item.get("chunk_text", "")
+    metadata = item.get("metadata", {})
+    if not isinstance(chunk_text, str) or not chunk_text.strip() or not isinstance(metadata, dict):
+        return False
+    topics = metadata.get("topics")
+    return topics is None or isinstance(topics, list)
+
 
 class PersianRAGTransformer:
     """
     Processes .txt files to produce RAG-compatible datasets.
     Skips already processed files, splits text into chunks, sends to LLM,
-    and saves normalized JSON output.
+    and appends normalized chunks to a JSON Lines file (one chunk per line).
     """
 
-    def __init__(self, txt_folder: str, links_json: str, output_json: str, chunk_size: int = 400):
+    def __init__(self, txt_folder: str, links_json: str, output_json: str, chunk_size: int = 400,
+                 concurrency: int = 20, chunks_per_call: int = CHUNKS_PER_CALL):
         cfg = load_config("./app/config/config.yaml")
         api_key = cfg["api"]["openai_key"]
         model_name = cfg["model"]["name_api"]
+        self.max_output_tokens = int(cfg["model"].get("max_output_tokens_api", MODEL_MAX_OUTPUT_TOKENS))
         base_url = "https://api.openai.com/v1"
 
         self.llm = LLM(model=model_name, api_key=api_key, base_url=base_url)
         self.txt_folder = Path(txt_folder)
         self.links_json = Path(links_json)
         self.output_json = Path(output_json)
+        # Raw LLM responses by exact request, so re-runs and failed-doc retries skip paid calls
+        self._llm_cache = SQLiteCache(str(self.output_json.with_name(".llm_transform_cache.db")))
         self.chunk_size = chunk_size
+        # Up to chunk_size whitespace-separated words per match (\s and \S are disjoint: no backtracking blowup)
+        self._chunk_re = re.compile(r"\S+(?:\s+\S+){0,%d}" % (chunk_size - 1))
+        # No more chunks per call than their output budgets fit in the model's completion limit
+        self.chunks_per_call = max(1, min(chunks_per_call, self.max_output_tokens // TRANSFORM_MAX_TOKENS))
+        self.concurrency = concurrency  # LLM requests in flight; 429s are retried with backoff by LLM
 
         # Load link metadata
-        with open(self.links_json, "r", encoding="utf-8") as f:
-            self.link_data = json.load(f)
+        self.link_data = orjson.loads(self.links_json.read_bytes())
         self.title_to_url = {i["title"]: i["url"] for i in self.link_data}
 
-        # Load existing RAG dataset to avoid reprocessing
-        self.existing_data = []
+        # Scan the existing dataset (titles + chunk count only) to avoid reprocessing
+        self.existing_count = 0
         self.existing_titles = set()
         if self.output_json.exists():
-            try:
-                with open(self.output_json, "r", encoding="utf-8") as f:
-                    self.existing_data = json.load(f)
-                    self.existing_titles = {chunk["metadata"]["title"] for chunk in self.existing_data}
-            except json.JSONDecodeError:
-                self.existing_data = []
-                self.existing_titles = set()
+            self._scan_existing()
 
         self.system_prompt = (
             "شما یک مدل زبانی هستید که برای استخراج داده‌های متنی فارسی برای سیستم‌های بازیابی و پاسخ‌گویی (RAG) طراحی شده‌اید. "
@@ -69,46 +156,110 @@ class PersianRAGTransformer:
             "]\n\n"
             "پاسخ باید فقط شامل JSON معتبر باشد و متن اضافی ننویسید."
         )
+        # Everything around {text} depends only on the document: formatted once per doc in
+        # _prompt_frame, then each chunk is concatenated in (same string as the full .format)
+        self._prompt_head, _, self._prompt_tail = self.user_prompt_template.partition("{text}")
+
+        # Several numbered chunks in one request; the answer holds one chunk array per input text
+        self.batch_prompt_template = (
+            "عنوان سند: {doc_name}\n"
+            "{texts}"
+            "لطفاً هر یک از {count} متن شماره‌دار بالا را جداگانه به چند چانک منطقی تقسیم کنید (حداکثر {chunk_size} کلمه) "
+            "و خروجی را به‌صورت یک آرایه JSON با دقیقاً {count} عضو تولید کنید؛ عضو شماره i آرایه چانک‌های متن شماره i است:\n"
+            "[\n"
+            "  [\n"
+            "    {{\n"
+            "      'chunk_text': '<بخش از متن>',\n"
+            "      'metadata': {{\n"
+            "         'title': '{doc_name}',\n"
+            "         'page_range': [start_page, end_page] یا None,\n"
+            "         'summary': '<خلاصه ۱ تا ۲ جمله‌ای>',\n"
+            "         'topics': ['موضوع۱', 'موضوع۲']\n"
+            "      }}\n"
+            "    }}\n"
+            "  ],\n"
+            "  ...\n"
+            "]\n\n"
+            "پاسخ باید فقط شامل JSON معتبر باشد و متن اضافی ننویسید."
+        )
+        self._batch_head, _, self._batch_tail = self.batch_prompt_template.partition("{texts}")
+
+    def _scan_existing(self) -> None:
+        """Stream the JSONL dataset line by line; a legacy JSON-array file is converted in place once."""
+        with open(self.output_json, "rb") as f:
+            head = f.read(64).lstrip()
+        if head.startswith(b"["):
+            try:
+                chunks = orjson.loads(self.output_json.read_bytes())
+            except orjson.JSONDecodeError:
+                logger.warning(f"Could not parse legacy dataset {self.output_json}; starting empty.")
+                chunks = []
+            self.output_json.write_bytes(b"".join(orjson.dumps(c) + b"\n" for c in chunks))
+            logger.info(f"Converted {self.output_json} to JSON Lines ({len(chunks)} chunks)")
+
+        with open(self.output_json, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    chunk = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    logger.warning(f"Skipping unreadable line {self.existing_count + 1} of {self.output_json}")
+                    continue
+                self.existing_count += 1
+                self.existing_titles.add(chunk["metadata"]["title"])
+
+    def _append_chunks(self, new_chunks: List[Chunk]) -> None:
+        """Append new chunks to the dataset; earlier lines are never rewritten."""
+        self.output_json.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.output_json, "ab") as f:
+            f.write(b"".join(orjson.dumps(chunk.to_dict()) + b"\n" for chunk in new_chunks))
+        self.existing_count += len(new_chunks)
+
+    def _match_url(self, doc_name: str) -> str:
+        """URL of the document's title: exact title first (O(1)), else the first title containing/contained in it."""
+        url = self.title_to_url.get(doc_name)
+        if url is not None:
+            return url
+        title = next((t for t in self.title_to_url if t in doc_name or doc_name in t), doc_name)
+        return self.title_to_url.get(title, "")
 
     def _split_text(self, text: str) -> List[str]:
-        """Split text into chunks of approx. self.chunk_size words."""
-        words = text.split()
-        return [" ".join(words[i:i + self.chunk_size]) for i in range(0, len(words), self.chunk_size)]
+        """Split text into chunks of approx. self.chunk_size words (one substring per chunk, no split/join)."""
+        return self._chunk_re.findall(text)
 
     def parse_llm_json(self, response: str) -> List[Dict[str, Any]]:
         """Safely parse JSON from LLM response, removing ```json ...``` blocks."""
-        m = re.search(r"```json\s*(.*?)\s*```", response, re.DOTALL)
+        m = _JSON_FENCE.search(response)
         json_str = m.group(1) if m else response.strip()
         try:
-            data = json.loads(json_str)
+            data = orjson.loads(json_str)
             if isinstance(data, dict):
                 return [data]
             return data
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             logger.warning(f"JSON parse failed: {e}; returning raw response wrapped as error.")
-            return [{"error": "JSON parse failed", "raw": response, "exception": str(e)}]
+            return [{"error": PARSE_FAILED, "raw": response, "exception": str(e)}]
 
-    def _normalize_chunk(self, raw_chunk: Dict[str, Any], doc_name: str, url: str, chunk_id: int) -> Dict:
+    def _normalize_chunk(self, raw_chunk: Dict[str, Any], doc_name: str, url: str, chunk_id: int) -> Chunk:
         """Normalize and enrich chunk output."""
-        metadata = raw_chunk.get("metadata", {})
-        return {
-            "doc_id": doc_name,
-            "chunk_id": chunk_id,
-            "chunk_text": raw_chunk.get("chunk_text", ""),
-            "metadata": {
-                "title": metadata.get("title", doc_name),
-                "url_file": url,
-                "page_range": metadata.get("page_range", None),
-                "summary": metadata.get("summary", ""),
-                "topics": metadata.get("topics", []),
-            },
-        }
+        get = raw_chunk.get("metadata", {}).get
+        return Chunk(
+            doc_id=doc_name,
+            chunk_id=chunk_id,
+            chunk_text=raw_chunk.get("chunk_text", ""),
+            title=get("title", doc_name),
+            url_file=url,
+            page_range=get("page_range", None),
+            summary=get("summary", ""),
+            topics=get("topics", []),
+        )
 
-    def generate_report(self, new_chunks: List[Dict[str, Any]]):
+    def generate_report(self, new_chunks: List[Chunk]):
         """Print summary report of processing."""
         total_new = len(new_chunks)
         total_duplicates = len(self.existing_titles)
-        total_errors = sum(1 for chunk in new_chunks if "error" in chunk)
+        total_errors = sum(1 for chunk in new_chunks if chunk.error is not None)
 
         logger.info("\n=== Processing Report ===")
         logger.info(f"New chunks processed: {total_new}")
@@ -116,109 +267,156 @@ class PersianRAGTransformer:
         logger.info(f"Failed chunks: {total_errors}")
         logger.info("========================\n")
 
+    def _prompt_frame(self, doc_name: str) -> tuple:
+        """(head, tail) of the user prompt for one document; a chunk's prompt is head + text + tail."""
+        fields = {"doc_name": doc_name, "chunk_size": self.chunk_size}
+        return self._prompt_head.format(**fields), self._prompt_tail.format(**fields)
+
+    async def _llm_json(self, prompt: str, sem: asyncio.Semaphore, max_tokens: int, is_valid):
+        """
+        One cached LLM call; returns the parsed JSON if is_valid(parsed), else UnexpectedShape,
+        or the LLM exception on failure.
+        """
+        key = prompt_key(self.system_prompt, prompt, self.llm.model, str(TRANSFORM_TEMPERATURE))
+        response = self._llm_cache.get(key)
+        if response is None:
+            async with sem:
+                try:
+                    response = await self.llm.agenerate_response(
+                        system=self.system_prompt,
+                        prompt=prompt,
+                        temperature=TRANSFORM_TEMPERATURE,
+                        max_tokens=max_tokens,
+                    )
+                except Exception as e:
+                    return e
+            cached = False
+        else:
+            cached = True
+
+        items = self.parse_llm_json(response)
+        if not is_valid(items):
+            return UnexpectedShape(f"Unexpected LLM JSON shape: {type(items).__name__}")
+        # Only answers whose every chunk passes the sanity check are cached, so run_retransform's
+        # retry of a failed document asks the LLM again instead of replaying the same bad chunks
+        flat = [c for item in items for c in (item if isinstance(item, list) else [item])]
+        if not cached and flat and all(map(_passes_sanity_check, flat)):
+            self._llm_cache.set(key, response)
+        return items
+
+    async def _llm_chunks(self, frame: tuple, t_chunk: str, sem: asyncio.Semaphore):
+        """One LLM call for one text chunk; returns the parsed items, or the exception on failure."""
+        head, tail = frame
+        max_tokens = min(TRANSFORM_MAX_TOKENS, self.max_output_tokens)
+        return await self._llm_json(head + t_chunk + tail, sem, max_tokens, _is_chunk_list)
+
+    async def _llm_batch(self, doc_name: str, frame: tuple, t_chunks: List[str], sem: asyncio.Semaphore) -> list:
+        """
+        Several text chunks of one document in one LLM call; returns one result per chunk,
+        as _llm_chunks would. If the batched call fails (e.g. a 400 for a too-long request) or its
+        answer has the wrong shape (unparsable, or not exactly one chunk array per text), each
+        chunk is retried on its own.
+        """
+        if len(t_chunks) == 1:
+            return [await self._llm_chunks(frame, t_chunks[0], sem)]
+
+        fields = {"doc_name": doc_name, "chunk_size": self.chunk_size, "count": len(t_chunks)}
+        texts = "".join(f"متن شماره {i}:\n{t}\n\n" for i, t in enumerate(t_chunks, 1))
+        prompt = self._batch_head.format(**fields) + texts + self._batch_tail.format(**fields)
+        result = await self._llm_json(
+            prompt, sem, min(TRANSFORM_MAX_TOKENS * len(t_chunks), self.max_output_tokens),
+            lambda items: isinstance(items, list) and len(items) == len(t_chunks) and all(map(_is_chunk_list, items)),
+        )
+        if isinstance(result, Exception):
+            logger.warning(f"Batched LLM call for {doc_name} unusable ({result}); retrying its chunks one by one")
+            return await asyncio.gather(*(self._llm_chunks(frame, t, sem) for t in t_chunks))
+        return result
+
+    async def _transform_doc(self, txt_file: Path, sem: asyncio.Semaphore) -> List[Chunk]:
+        """
+        Run all chunks of one file through the LLM, then append them to the dataset at once,
+        so a crash loses only the documents still in flight (their titles are not yet recorded).
+        """
+        doc_name = txt_file.stem
+        try:
+            text = txt_file.read_text(encoding="utf-8")
+        except Exception as e:
+            logger.exception(f"Error reading {txt_file.name}: {e}")
+            url, results = "", [e]
+        else:
+            url = self._match_url(doc_name)
+            frame = self._prompt_frame(doc_name)
+            t_chunks, k = self._split_text(text), self.chunks_per_call
+            batches = await asyncio.gather(
+                *(self._llm_batch(doc_name, frame, t_chunks[i:i + k], sem) for i in range(0, len(t_chunks), k))
+            )
+            results = [result for batch in batches for result in batch]
+
+        # No await from here on: chunk ids and the append stay consistent across documents
+        doc_chunks = []
+        for result in results:
+            chunk_id = self.existing_count + len(doc_chunks)
+            if isinstance(result, Exception):
+                logger.error(f"Error processing a chunk of {doc_name}: {result}")
+                doc_chunks.append(Chunk(doc_id=doc_name, chunk_id=chunk_id, title=doc_name, error=str(result)))
+                continue
+            for raw in result:
+                doc_chunks.append(self._normalize_chunk(raw, doc_name, url, chunk_id=self.existing_count + len(doc_chunks)))
+        self._append_chunks(doc_chunks)
+        return doc_chunks
+
+    async def _transform_files(self, txt_files: List[Path], desc: str) -> List[Chunk]:
+        """
+        Send the chunks of all files to the LLM concurrently (at most self.concurrency
+        in flight); each document is checkpointed to disk as soon as its chunks are done.
+        """
+        sem = asyncio.Semaphore(self.concurrency)
+        try:
+            per_doc = await tqdm_asyncio.gather(
+                *(self._transform_doc(txt_file, sem) for txt_file in txt_files), desc=desc, unit="doc"
+            )
+        finally:
+            await self.llm.aclose()  # its pool belongs to this event loop
+        return [chunk for doc_chunks in per_doc for chunk in doc_chunks]
+
+    def _txt_files(self, keep) -> List[Path]:
+        """.txt files in txt_folder whose stem passes keep(stem); one scandir pass, no per-file stat."""
+        with os.scandir(self.txt_folder) as it:
+            return [
+                Path(e.path) for e in it
+                if e.name.endswith(".txt") and keep(e.name[:-4])
+            ]
+
     def process_documents(self):
         """Process all .txt files, skip already processed ones, and save JSON."""
-        txt_files = list(self.txt_folder.glob("*.txt"))
-        new_chunks = []
+        txt_files = self._txt_files(lambda stem: stem not in self.existing_titles)
+        if self.existing_titles:
+            logger.info(f"Skipping .txt files of {len(self.existing_titles)} documents already in the dataset")
 
-        for txt_file in tqdm(txt_files, desc="Processing documents", unit="doc"):
-            doc_name = txt_file.stem
-            if doc_name in self.existing_titles:
-                logger.info(f"Skipping already processed file: {txt_file.name}")
-                continue
+        logger.info(f"Processing {len(txt_files)} documents")
+        new_chunks = asyncio.run(self._transform_files(txt_files, desc="Processing documents"))
 
-            try:
-                logger.info(f"Processing {txt_file.name}")
-                text = txt_file.read_text(encoding="utf-8")
-
-                # Match title → url
-                title = next((t for t in self.title_to_url if t in doc_name or doc_name in t), doc_name)
-                url = self.title_to_url.get(title, "")
-
-                # Split text into chunks
-                text_chunks = self._split_text(text)
-                for t_chunk in text_chunks:
-                    prompt = self.user_prompt_template.format(
-                        doc_name=doc_name, text=t_chunk, chunk_size=self.chunk_size
-                    )
-                    response = self.llm.generate_response(
-                        system=self.system_prompt,
-                        prompt=prompt,
-                        temperature=0.3,
-                        max_tokens=2048,
-                    )
-                    raw_items = self.parse_llm_json(response)
-                    for raw in raw_items:
-                        normalized = self._normalize_chunk(raw, doc_name, url, chunk_id=len(self.existing_data) + len(new_chunks))
-                        new_chunks.append(normalized)
-
-            except Exception as e:
-                logger.exception(f"Error processing {txt_file.name}: {e}")
-                new_chunks.append({
-                    "doc_id": doc_name,
-                    "chunk_id": len(self.existing_data) + len(new_chunks),
-                    "chunk_text": "",
-                    "metadata": {"title": doc_name, "url_file": "", "page_range": None, "summary": None},
-                    "error": str(e)
-                })
-
-        # Combine old and new chunks
-        all_chunks = self.existing_data + new_chunks
-        with open(self.output_json, "w", encoding="utf-8") as f:
-            json.dump(all_chunks, f, ensure_ascii=False, indent=2)
-        logger.info(f"Saved {len(new_chunks)} new chunks, total {len(all_chunks)} chunks to {self.output_json}")
+        logger.info(f"Saved {len(new_chunks)} new chunks, total {self.existing_count} chunks to {self.output_json}")
 
         # Generate report
         self.generate_report(new_chunks)
 
-    def process_specific_documents(self, doc_ids: List[str]):
-        """Reprocess only specific documents and save JSON."""
-        txt_files = [f for f in self.txt_folder.glob("*.txt") if f.stem in doc_ids]
+    def process_specific_documents(self, doc_ids: Iterable[Union[str, Dict[str, Any]]]):
+        """
+        Reprocess only specific documents and save JSON.
+        doc_ids are ids, or failure-report rows ({"doc_id": ..., "reasons": [...]}) as written by sanity_check.
+        """
+        # O(1) membership per file instead of a list scan
+        doc_ids = frozenset(d["doc_id"] if isinstance(d, dict) else d for d in doc_ids)
+        txt_files = self._txt_files(doc_ids.__contains__)
         if not txt_files:
             logger.warning("No matching text files found for the given doc_ids.")
             return
 
-        new_chunks = []
+        logger.info(f"Reprocessing {len(txt_files)} documents")
+        new_chunks = asyncio.run(self._transform_files(txt_files, desc="Reprocessing specific documents"))
 
-        for txt_file in tqdm(txt_files, desc="Reprocessing specific documents", unit="doc"):
-            doc_name = txt_file.stem
-            try:
-                logger.info(f"Reprocessing {txt_file.name}")
-                text = txt_file.read_text(encoding="utf-8")
-
-                title = next((t for t in self.title_to_url if t in doc_name or doc_name in t), doc_name)
-                url = self.title_to_url.get(title, "")
-
-                text_chunks = self._split_text(text)
-                for t_chunk in text_chunks:
-                    prompt = self.user_prompt_template.format(
-                        doc_name=doc_name, text=t_chunk, chunk_size=self.chunk_size
-                    )
-                    response = self.llm.generate_response(
-                        system=self.system_prompt,
-                        prompt=prompt,
-                        temperature=0.3,
-                        max_tokens=2048,
-                    )
-                    raw_items = self.parse_llm_json(response)
-                    for raw in raw_items:
-                        normalized = self._normalize_chunk(raw, doc_name, url, chunk_id=len(self.existing_data) + len(new_chunks))
-                        new_chunks.append(normalized)
-
-            except Exception as e:
-                logger.exception(f"Error reprocessing {txt_file.name}: {e}")
-                new_chunks.append({
-                    "doc_id": doc_name,
-                    "chunk_id": len(self.existing_data) + len(new_chunks),
-                    "chunk_text": "",
-                    "metadata": {"title": doc_name, "url_file": "", "page_range": None, "summary": None},
-                    "error": str(e)
-                })
-
-        all_chunks = self.existing_data + new_chunks
-        with open(self.output_json, "w", encoding="utf-8") as f:
-            json.dump(all_chunks, f, ensure_ascii=False, indent=2)
-        logger.info(f"Reprocessed {len(new_chunks)} chunks, total {len(all_chunks)} chunks to {self.output_json}")
+        logger.info(f"Reprocessed {len(new_chunks)} chunks, total {self.existing_count} chunks to {self.output_json}")
 
         # Generate report
         self.generate_report(new_chunks)
@@ -228,7 +426,7 @@ if __name__ == "__main__":
     processor = PersianRAGTransformer(
         txt_folder="../downloads/txt",
         links_json="../downloads/downloaded_files.json",
-        output_json="../downloads/rag_dataset_llm.json",
+        output_json="../downloads/rag_dataset_llm.jsonl",
         chunk_size=400
     )
     processor.process_documents()
@@ -1,3 +1,4 @@
+import functools
 import os
 
 
@@ -17,7 +18,15 @@ def load_prompt(category: str, name: str) -> str:
         app/prompts/system/default.txt
     """
     path = os.path.join(PROMPT_DIR, category, f"{name}.txt")
-    if not os.path.exists(path):
-        raise FileNotFoundError(f"Prompt not found: {path}")
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Prompt not found: {path}") from None
+    return _read_prompt(path, mtime_ns)
+
+
+@functools.lru_cache(maxsize=32)
+def _read_prompt(path: str, mtime_ns: int) -> str:
+    """File contents, cached per (path, mtime): editing the prompt invalidates the entry."""
     with open(path, "r", encoding="utf-8") as file:
         return file.read()
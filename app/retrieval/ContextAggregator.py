@@ -1,8 +1,20 @@
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any, Optional
 from app.ingestion.load.loader import RAGStorage
 from app.agents.llm_api import LLM
 from app.utils.utils import load_config
 
+SEARCH_WORKERS = 8  # concurrent Chroma/ES searches per builder
+
+
+def dedupe_by_doc_id(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Keep the first doc per doc_id, in order (one dict hash per doc; docs without doc_id share one slot)."""
+    unique: Dict[Any, Dict[str, Any]] = {}
+    for doc in docs:
+        unique.setdefault(doc.get("doc_id"), doc)
+    return list(unique.values())
+
 
 class QueryCollection:
     """
@@ -10,40 +22,58 @@ class QueryCollection:
     Used as a fallback when direct retrieval fails.
     """
 
-    def __init__(self, chroma_path: str, collection_name: str = "query_collection"):
+    def __init__(
+        self,
+        chroma_path: str,
+        collection_name: str = "query_collection",
+        embedder: Optional[RAGStorage] = None,
+    ):
         # Create a Chroma-only RAGStorage (no Elasticsearch)
         self.storage = RAGStorage(
             chroma_collection_name=collection_name,
             es_index_name="query_es_dummy",  # placeholder
             chroma_path=chroma_path,
         )
+        # storage whose embed_queries (and its memo) is used; sharing the retrieval storage
+        # means a query already embedded for Chroma is not embedded again here
+        self._embedder = embedder or self.storage
+
+    @staticmethod
+    def query_id(query: str) -> str:
+        """Chroma id for a query; unlike hash(), stable across processes and restarts."""
+        return "query_" + hashlib.blake2b(query.encode("utf-8"), digest_size=8).hexdigest()
 
     def add_query(self, query: str):
         """Add a new user query to the query collection."""
-        doc_id = f"query_{abs(hash(query))}"
-        response = self.storage.ollama.embeddings(model=self.storage.model_name, prompt=query)
-        embedding = response["embedding"]
-
-        self.storage.collection.add(
-            ids=[doc_id],
-            embeddings=[embedding],
-            documents=[query],
-            metadatas=[{"source": "user_query"}],
+        self.add_queries([query])
+
+    def add_queries(self, queries: List[str]):
+        """Add several user queries with one embedding round and one collection.add."""
+        queries = list(dict.fromkeys(queries))  # duplicate ids in one add are rejected by Chroma
+        if not queries:
+            return
+        # upsert: a query already stored (same id) is overwritten in place, not duplicated
+        self.storage.collection.upsert(
+            ids=[self.query_id(q) for q in queries],
+            embeddings=self._embedder.embed_queries(queries),
+            documents=queries,
+            metadatas=[{"source": "user_query"} for _ in queries],
         )
 
     def find_similar(self, query: str, top_k: int = 1) -> Optional[str]:
         """Find the most semantically similar past query from ChromaDB."""
-        response = self.storage.ollama.embeddings(model=self.storage.model_name, prompt=query)
-        query_embedding = response["embedding"]
+        return self.find_similar_batch([query], top_k=top_k)[0]
 
+    def find_similar_batch(self, queries: List[str], top_k: int = 1) -> List[Optional[str]]:
+        """Most similar past query for each query (None where nothing is stored), in one Chroma query."""
+        if not queries:
+            return []
         results = self.storage.collection.query(
-            query_embeddings=[query_embedding],
+            query_embeddings=self._embedder.embed_queries(queries),
             n_results=top_k,
         )
-
-        if not results["documents"] or not results["documents"][0]:
-            return None
-        return results["documents"][0][0]  # return most similar query
+        docs = results["documents"] or [[] for _ in queries]
+        return [d[0] if d else None for d in docs]  # most similar query per input
 
 
 class RAGPromptBuilder:
@@ -71,23 +101,14 @@ class RAGPromptBuilder:
             es_index_name=es_index_name,
             chroma_path=chroma_path,
         )
-        self.query_collection = QueryCollection(chroma_path)
+        self.query_collection = QueryCollection(chroma_path, embedder=self.storage)
+        self._search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="rag-search")
 
     def retrieve_all(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
         """Retrieve from both Chroma and Elasticsearch."""
+        es_future = self._search_pool.submit(self.storage.es_search, query, top_k=top_k)
         semantic_results = self.storage.semantic_search(query, top_k=top_k)
-        es_results = self.storage.es_search(query, top_k=top_k)
-        combined = semantic_results + es_results
-
-        # deduplicate
-        seen = set()
-        unique = []
-        for doc in combined:
-            doc_id = doc.get("doc_id")
-            if doc_id not in seen:
-                unique.append(doc)
-                seen.add(doc_id)
-        return unique
+        return dedupe_by_doc_id(semantic_results + es_future.result())
 
     @staticmethod
     def build_prompt(retrieved_docs: List[Dict[str, Any]], user_question: str, max_context: int = 5) -> str:
@@ -139,8 +160,7 @@ class RAGPromptBuilder:
         docs = self.retrieve_all(rewritten_q, top_k=top_k)
         if docs:
             print(f"[Fallback] Used rewritten query: {rewritten_q}")
-            self.query_collection.add_query(query)
-            self.query_collection.add_query(rewritten_q)
+            self.query_collection.add_queries([query, rewritten_q])
             return self.build_prompt(docs, query, max_context=max_context)
 
         return "هیچ سند مرتبطی یافت نشد."
@@ -170,19 +190,15 @@ class RAGPromptBuilder:
         except Exception:
             subqueries = [query]  # fallback if LLM parsing fails
 
+        # ES searches for every subquery run concurrently with the batched Chroma search
+        es_futures = [self._search_pool.submit(self.storage.es_search, q, top_k=top_k) for q in subqueries]
+        semantic_results = self.storage.semantic_search_batch(subqueries, top_k=top_k)
         all_docs = []
-        for sub_q in subqueries:
-            sub_docs = self.retrieve_all(sub_q, top_k=top_k)
-            all_docs.extend(sub_docs)
-
-        # deduplicate
-        seen = set()
-        unique_docs = []
-        for d in all_docs:
-            doc_id = d.get("doc_id")
-            if doc_id not in seen:
-                unique_docs.append(d)
-                seen.add(doc_id)
+        for sub_semantic, es_future in zip(semantic_results, es_futures):
+            all_docs.extend(sub_semantic)
+            all_docs.extend(es_future.result())
+
+        unique_docs = dedupe_by_doc_id(all_docs)
 
         if not unique_docs:
             return self.retrieve_with_fallback(query, top_k=top_k, max_context=max_context)
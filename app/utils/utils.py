@@ -5,6 +5,8 @@ utils.py
     from utils import load_config, load_system_prompt, trim_contexts, build_prompt
 """
 
+import copy
+import functools
 import os
 import logging
 from pathlib import Path
@@ -17,17 +19,30 @@ from typing import List, Dict, Any
 logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
 logger = logging.getLogger(__name__)
 
+# libyaml-backed loader when PyYAML was built with it (same safe subset, parsed in C)
+_YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 
 # ----------------------------------------------------------------------
+@functools.lru_cache(maxsize=8)
+def _read_config(path: str, mtime_ns: int) -> dict:
+    """Parsed YAML, cached per (path, mtime): editing the file invalidates the entry."""
+    with open(path, "r", encoding="utf-8") as f:
+        config = yaml.load(f, Loader=_YamlLoader)
+    logger.info("تنظیمات از config.yaml بارگذاری شد.")
+    return config
+
+
 def load_config(config_path: str = "./config/config.yaml") -> dict:
 
     path = Path(config_path)
-    if not path.exists():
-        raise FileNotFoundError(f"فایل تنظیمات پیدا نشد: {config_path}")
-
-    with open(path, "r", encoding="utf-8") as f:
-        config = yaml.safe_load(f)
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        raise FileNotFoundError(f"فایل تنظیمات پیدا نشد: {config_path}") from None
 
+    # deep copy: callers may mutate their config, and env overrides are applied on every call
+    config = copy.deepcopy(_read_config(str(path), mtime_ns))
 
     config["model"]["name_api"] = os.getenv("MODEL_NAME_API", config["model"].get("name_api"))
     config["api"]["openrouter_key"] = os.getenv("OPENROUTER_API_KEY", config["api"].get("openrouter_key"))
@@ -40,7 +55,6 @@ def load_config(config_path: str = "./config/config.yaml") -> dict:
         os.getenv("MAX_CONTEXT_CHARS", config["limits"].get("max_context_chars", 3000)))
 
 
-    logger.info("تنظیمات از config.yaml بارگذاری شد.")
     return config
 
 
@@ -50,14 +64,15 @@ def load_config(config_path: str = "./config/config.yaml") -> dict:
 def trim_contexts(aggregated_results: List[Dict[str, Any]], max_blocks: int, max_chars: int) -> List[Dict[str, Any]]:
 
     selected = aggregated_results[:max_blocks]
-    total_chars = sum(len(r.get("text", "")) for r in selected)
+    texts = [r.get("text", "") for r in selected]  # looked up once, reused for the trim
+    total_chars = sum(map(len, texts))
     if total_chars <= max_chars:
         return selected
 
     ratio = max_chars / total_chars
     trimmed = []
-    for r in selected:
-        text = r.get("text", "").strip()
+    for r, text in zip(selected, texts):
+        text = text.strip()
         max_len = max(200, int(len(text) * ratio))
         if len(text) > max_len:
             head = text[: max_len // 2]
@@ -69,6 +84,17 @@ def trim_contexts(aggregated_results: List[Dict[str, Any]], max_blocks: int, max
     return trimmed
 
 
+# Fixed instruction block of build_prompt, laid out once at import instead of per call
+_PROMPT_INSTRUCTIONS = textwrap.dedent("""\
+    دستورالعمل‌ها:
+    - فقط به فارسی رسمی پاسخ بده و فقط از زمینه‌های داده‌شده استفاده کن.
+    - اگر اطلاعات کافی نیست، صراحتاً بگو "اطلاعات در دسترس نیست".
+    - ابتدا با ۲–۴ جمله خلاصه شروع کن (بدون عنوان Markdown).
+    - سپس جزئیات را با Markdown ساختاربندی کن (##، لیست، جدول).
+    - اگر از زمینه نقل می‌کنی، منبع را ذکر کن (مثلاً: منبع: <نام فایل>).
+""").strip()
+
+
 # ----------------------------------------------------------------------
 def build_prompt(
     user_query: str,
@@ -89,18 +115,4 @@ def build_prompt(
 
     system_text = f"{system_prompt}\n" if system_prompt else ""
 
-    prompt = f"""
-    {system_text}
-    پرسش کاربر: {user_query}
-
-    زمینه‌های مرتبط:
-    {contexts}
-
-    دستورالعمل‌ها:
-    - فقط به فارسی رسمی پاسخ بده و فقط از زمینه‌های داده‌شده استفاده کن.
-    - اگر اطلاعات کافی نیست، صراحتاً بگو "اطلاعات در دسترس نیست".
-    - ابتدا با ۲–۴ جمله خلاصه شروع کن (بدون عنوان Markdown).
-    - سپس جزئیات را با Markdown ساختاربندی کن (##، لیست، جدول).
-    - اگر از زمینه نقل می‌کنی، منبع را ذکر کن (مثلاً: منبع: <نام فایل>).
-    """
-    return textwrap.dedent(prompt).strip()
\ No newline at end of file
+    return f"{system_text}\nپرسش کاربر: {user_query}\n\nزمینه‌های مرتبط:\n{contexts}\n\n{_PROMPT_INSTRUCTIONS}".strip()
\ No newline at end of file
@@ -1,14 +1,15 @@
-"""Extract failed doc_ids from a RAG JSON and save them for reprocessing.
+"""Extract failed doc_ids from a RAG JSON Lines dataset and save them for reprocessing.
 
 Usage:
-    python extract_failed_docs.py --input ../downloads/rag_dataset_llm.json \
+    python extract_failed_docs.py --input ../downloads/rag_dataset_llm.jsonl \
         --output ../downloads/failed_docs_to_retry.json
 """
 from pathlib import Path
-import json
 import argparse
 from typing import Dict, Set, List
 
+import orjson
+
 
 REQUIRED_TOPLEVEL_KEYS = {"doc_id", "chunk_id", "chunk_text", "metadata"}
 REQUIRED_METADATA_KEYS = {"title", "page_range", "summary", "topics"}
@@ -28,55 +29,46 @@ def analyze_rag_json(input_path: Path) -> Dict[str, Set[str]]:
     if not input_path.exists():
         raise FileNotFoundError(f"Input file not found: {input_path}")
 
-    with input_path.open("r", encoding="utf-8") as fh:
-        data = json.load(fh)
-
+    req_top, req_meta = REQUIRED_TOPLEVEL_KEYS, REQUIRED_METADATA_KEYS
     failures: Dict[str, Set[str]] = {}
 
-    for i, chunk in enumerate(data):
-        # Safely get doc_id (use placeholder if missing)
-        doc_id = str(chunk.get("doc_id") or f"__missing_docid_chunk_{i}")
-
-        # Ensure set exists
-        if doc_id not in failures:
-            failures[doc_id] = set()
-
-        # 1) explicit error field
-        err = chunk.get("error")
-        if err:
-            failures[doc_id].add("error")
-
-        # 2) top-level keys
-        missing_top = REQUIRED_TOPLEVEL_KEYS - set(chunk.keys())
-        if missing_top:
-            failures[doc_id].add("missing_toplevel")
-
-        # 3) chunk_text empty
-        chunk_text = chunk.get("chunk_text", "")
-        if not isinstance(chunk_text, str) or not chunk_text.strip():
-            failures[doc_id].add("empty_chunk_text")
-
-        # 4) metadata checks
-        metadata = chunk.get("metadata")
-        if not isinstance(metadata, dict):
-            failures[doc_id].add("missing_metadata")
-        else:
-            missing_meta = REQUIRED_METADATA_KEYS - set(metadata.keys())
-            if missing_meta:
-                failures[doc_id].add("missing_metadata")
-
-            topics = metadata.get("topics")
-            if topics is not None and not isinstance(topics, list):
-                failures[doc_id].add("invalid_topics")
-
-        # If for a doc_id there are no reasons collected, remove the key later.
-        # (we keep temporarily; will filter after loop)
-
-    # remove doc_ids with empty reason sets (no problems)
-    cleaned: Dict[str, Set[str]] = {
-        did: reasons for did, reasons in failures.items() if reasons
-    }
-    return cleaned
+    # Single streaming pass: one line parsed at a time, and a reason set is only
+    # created for doc_ids that actually fail (no empty sets to filter afterwards).
+    with input_path.open("rb") as fh:
+        lines = (line for line in fh if line.strip())
+        for i, chunk in enumerate(map(orjson.loads, lines)):
+            reasons = []
+
+            # 1) explicit error field
+            if chunk.get("error"):
+                reasons.append("error")
+
+            # 2) top-level keys (set - keys view: no copy of the chunk's keys)
+            if req_top - chunk.keys():
+                reasons.append("missing_toplevel")
+
+            # 3) chunk_text empty
+            chunk_text = chunk.get("chunk_text", "")
+            if not isinstance(chunk_text, str) or not chunk_text.strip():
+                reasons.append("empty_chunk_text")
+
+            # 4) metadata checks
+            metadata = chunk.get("metadata")
+            if not isinstance(metadata, dict):
+                reasons.append("missing_metadata")
+            else:
+                if req_meta - metadata.keys():
+                    reasons.append("missing_metadata")
+                topics = metadata.get("topics")
+                if topics is not None and not isinstance(topics, list):
+                    reasons.append("invalid_topics")
+
+            if reasons:
+                # Safely get doc_id (use placeholder if missing)
+                doc_id = str(chunk.get("doc_id") or f"__missing_docid_chunk_{i}")
+                failures.setdefault(doc_id, set()).update(reasons)
+
+    return failures
 
 
 def save_failed_docs(failed_map: Dict[str, Set[str]], output_path: Path) -> None:
@@ -86,8 +78,7 @@ def save_failed_docs(failed_map: Dict[str, Set[str]], output_path: Path) -> None
         out_list.append({"doc_id": doc_id, "reasons": sorted(list(reasons))})
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    with output_path.open("w", encoding="utf-8") as fh:
-        json.dump(out_list, fh, ensure_ascii=False, indent=2)
+    output_path.write_bytes(orjson.dumps(out_list, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
 
 
 def build_txt_retry_list(failed_map: Dict[str, Set[str]], txt_folder: Path) -> List[str]:
@@ -113,7 +104,7 @@ def main():
         "-i",
         type=str,
         required=True,
-        help="Path to input RAG JSON (e.g. ../downloads/rag_dataset_llm.json)",
+        help="Path to input RAG JSON Lines (e.g. ../downloads/rag_dataset_llm.jsonl)",
     )
     parser.add_argument(
         "--output",
@@ -152,12 +143,11 @@ def main():
         retry_list = build_txt_retry_list(failed_map, txt_folder)
         txt_list_path = output_path.with_name(output_path.stem + ".txt_list.json")
         txt_list_path.parent.mkdir(parents=True, exist_ok=True)
-        with txt_list_path.open("w", encoding="utf-8") as fh:
-            json.dump(retry_list, fh, ensure_ascii=False, indent=2)
+        txt_list_path.write_bytes(orjson.dumps(retry_list, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE))
         print(f"Saved txt retry list to {txt_list_path}")
 
 
 if __name__ == "__main__":
     main()
 
-# python json_test.py -i ../downloads/rag_dataset_llm.json -o ../downloads/failed_docs_to_retry.json  --save-txt-list -t ../downloads/
+# python json_test.py -i ../downloads/rag_dataset_llm.jsonl -o ../downloads/failed_docs_to_retry.json  --save-txt-list -t ../downloads/